@@ -1,18 +1,82 @@
+import os
+import re
+import threading
 from datetime import datetime
 from calendar import monthrange
-import random
-from flask import Flask, render_template, request
+from flask import Flask, jsonify, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from games import wire
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "deathroll-secret"
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", **wire.socketio_options())
 
-from games.duel import init_duel
-init_duel(app, socketio)
+from services.plugins import PluginRegistry
+from services import templatecache
+
+# compiled templates are cached on disk and shared by every worker
+templatecache.configure(app)
+
+# optional modules load in the background; the app starts even if one is missing
+plugins = PluginRegistry(app, socketio)
+plugins.init("duel", "games.duel:init_duel")
+plugins.blueprint("imgconvert", "services.imgconvert:bp", probe="/imgconvert")
+# last, so blueprint templates are compiled too
+plugins.init("templates", "services.templatecache:warm")
+plugins.start()
+
+from services import profiler
+app.register_blueprint(profiler.bp)
+
+from services.admission import Admission
+
+# per-connection rate limits, and load shedding of chat/queue events when lagging
+admission = Admission(socketio)
+
+from services.analytics import Analytics
+
+# unique players, match lengths and bet sizes per hour, in fixed memory
+analytics = Analytics()
+analytics.init_app(app)
+
+from games.rng import RandomStream
+from games import eventlog
+from games.eventlog import EventLog
+from games.deathroll_odds import odds as deathroll_odds
+from games import bj_strategy
+from games.spectate import Spectators
+from games.lobby import Lobby
+from games.roomlocks import RoomLocks
+from games.ledger import Ledger
+
+match_log = EventLog(os.environ.get("MATCH_LOG_PATH", "match_events.bin"))
+ledger = Ledger(os.environ.get("LEDGER_PATH", "ledger.sqlite3"))
+
+
+PVP_MAX_BET = 1_000_000  # wallets live in the browser; this caps what reaches the ledger
+
+
+def _parse_bet(amount):
+    """-> (bet, None) for a whole bet in 1..PVP_MAX_BET, else (None, reason for the player)."""
+    if isinstance(amount, bool) or (isinstance(amount, float) and not amount.is_integer()):
+        return None, "Invalid bet amount."
+    try:
+        bet = int(amount)
+    except (TypeError, ValueError, OverflowError):
+        return None, "Invalid bet amount."
+    if bet <= 0:
+        return None, "Bet must be greater than 0."
+    if bet > PVP_MAX_BET:
+        return None, f"Bets are limited to {PVP_MAX_BET:,}."
+    return bet, None
+
+# Events for one room are serialized by its shard lock; different rooms run in
+# parallel. Queues, sid maps, the room tables and bj_open_rooms are shared by
+# every room: every change to them happens under matchmaking_lock, which may
+# be taken while holding a room lock but never the other way around.
+room_locks = RoomLocks()
+matchmaking_lock = threading.Lock()
 
-from services.imgconvert import bp as imgconvert_bp
-app.register_blueprint(imgconvert_bp)
 # ---------------- Deathroll PvP ----------------
 pvp_queue = []
 pvp_rooms = {}
@@ -20,9 +84,22 @@ pvp_rooms = {}
 sid_to_room = {}
 
 # ---------------- Blackjack PvP ----------------
+BJ_MAX_SEATS = 7
+BJ_SERIES_HANDS = 5     # best of 5 per table
+# games/eventlog.py replays shoes with these; keep SHOE_DECKS and SHOE_PENETRATION in step
+BJ_SHOE_DECKS = 6
+BJ_PENETRATION = 0.75   # cut card: reshuffle once this much of the shoe is dealt
+
 bj_queue = []
 bj_rooms = {}
 bj_sid_to_room = {}
+bj_open_rooms = set()  # tables with a free seat that can take players from bj_queue
+
+profiler.watch(
+    pvp_queue=pvp_queue, pvp_rooms=pvp_rooms, sid_to_room=sid_to_room,
+    bj_queue=bj_queue, bj_rooms=bj_rooms, bj_sid_to_room=bj_sid_to_room,
+    bj_open_rooms=bj_open_rooms,
+)
 
 # ---------------- Time calculator ----------------
 
@@ -361,13 +438,13 @@ DECK_FLAVOR = {
     ],
 }
 
-def darkmoon_flavor_from_chance(chance, deck):
+def darkmoon_flavor_from_chance(chance, deck, rng):
     # ---------- Critical results override EVERYTHING ----------
     if chance >= CRIT_SUCCESS_THRESHOLD:
-        return random.choice(CRITICAL_TEXT["success"])
+        return rng.choice(CRITICAL_TEXT["success"])
 
     if chance <= CRIT_FAILURE_THRESHOLD:
-        return random.choice(CRITICAL_TEXT["failure"])
+        return rng.choice(CRITICAL_TEXT["failure"])
 
     # ---------- Normal tier flavor ----------
     if chance < 25:
@@ -381,19 +458,17 @@ def darkmoon_flavor_from_chance(chance, deck):
     else:
         tier = "overwhelming"
 
-    base = random.choice(FLAVOR_TEXT[tier])
+    base = rng.choice(FLAVOR_TEXT[tier])
 
     # ---------- Deck overlay (non-critical only) ----------
     if deck in DECK_FLAVOR:
-        overlay = random.choice(DECK_FLAVOR[deck])
+        overlay = rng.choice(DECK_FLAVOR[deck])
         return f"{base} {overlay}"
 
     return base
 
 # ---------------- Darkmoon luck calculator ----------------
 
-import random
-
 CARD_VALUES = {
     "Ace": 10,
     "2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7,
@@ -403,6 +478,8 @@ CARD_VALUES = {
     "King": -10,
 }
 
+CARD_ITEMS = list(CARD_VALUES.items())
+
 DIFFICULTY = {
     "trivial": 20,
     "normal": 40,
@@ -410,18 +487,20 @@ DIFFICULTY = {
     "legendary": 100,
 }
 
-def darkmoon_draw_cards(n):
+def darkmoon_draw_cards(n, rng):
     """
     n: number of cards to draw
+    rng: RandomStream
     returns: list of (card_name, value)
     """
-    return random.choices(list(CARD_VALUES.items()), k=n)
+    return rng.choices(CARD_ITEMS, k=n)
 
 
-def darkmoon_apply_deck(draws, deck):
+def darkmoon_apply_deck(draws, deck, rng):
     """
     draws: list of (card, value)
     deck: deck name (string)
+    rng: RandomStream (for the decks with random multipliers)
     returns: modified luck score (float)
     """
     values = [v for _, v in draws]
@@ -442,10 +521,10 @@ def darkmoon_apply_deck(draws, deck):
         return sum(v * 1.4 if v > 0 else v * 1.2 for v in values)
 
     if deck == "War":
-        return sum(v * random.uniform(0.5, 1.8) for v in values)
+        return sum(v * rng.uniform(0.5, 1.8) for v in values)
 
     if deck == "Nightmares":
-        return sum(v * random.uniform(0.5, 1.1) for v in values)
+        return sum(v * rng.uniform(0.5, 1.1) for v in values)
 
     if deck == "Tragedy":
         return sum(v * 0.7 if v > 0 else v * 1.5 for v in values)
@@ -458,10 +537,10 @@ def darkmoon_apply_deck(draws, deck):
         return avg * len(values)
 
     if deck == "Madness":
-        return sum(v * random.uniform(0.3, 2.0) for v in values)
+        return sum(v * rng.uniform(0.3, 2.0) for v in values)
 
     if deck == "Fables":
-        return sum(v * random.uniform(0.9, 1.3) for v in values)
+        return sum(v * rng.uniform(0.9, 1.3) for v in values)
 
     if deck == "Dominion":
         total = sum(values)
@@ -470,15 +549,17 @@ def darkmoon_apply_deck(draws, deck):
     raise ValueError("Unknown deck")
 
 
-def darkmoon_luck_calc(num_cards, deck, difficulty):
+def darkmoon_luck_calc(num_cards, deck, difficulty, seed=None):
     """
     num_cards: int
     deck: string
     difficulty: string
-    returns: dict with score, chance, cards
+    seed: replay a previous reading (new random seed if None)
+    returns: dict with score, chance, cards, seed
     """
-    draws = darkmoon_draw_cards(num_cards)
-    score = darkmoon_apply_deck(draws, deck)
+    rng = RandomStream(seed)
+    draws = darkmoon_draw_cards(num_cards, rng)
+    score = darkmoon_apply_deck(draws, deck, rng)
 
     required = DIFFICULTY[difficulty]
     chance = max(0, min(100, int((score / required) * 100)))
@@ -489,7 +570,8 @@ def darkmoon_luck_calc(num_cards, deck, difficulty):
         "cards": [card for card, _ in draws],
         "deck": deck,
         "difficulty": difficulty.capitalize(),
-        "comment": darkmoon_flavor_from_chance(chance, deck),
+        "comment": darkmoon_flavor_from_chance(chance, deck, rng),
+        "seed": rng.seed,
     }
 
 
@@ -500,6 +582,24 @@ def index():
     return render_template("index.html")
 
 
+def render_calc(page, fragment, context, **page_only):
+    """
+    Calculator response in the form the client asked for:
+    JSON of `context` (Accept: application/json), just the result fragment
+    (X-Fragment header, used by the pages to update in place), or the full page.
+    """
+    if request.accept_mimetypes.best == "application/json":
+        response = jsonify(context)
+        if context.get("error"):
+            response.status_code = 400
+    elif request.headers.get("X-Fragment"):
+        response = app.make_response(render_template(fragment, **context))
+    else:
+        response = app.make_response(render_template(page, **context, **page_only))
+    response.vary.update(("Accept", "X-Fragment"))
+    return response
+
+
 @app.route("/time", methods=["GET", "POST"])
 def time_calc():
     results = None
@@ -507,7 +607,7 @@ def time_calc():
         value = float(request.form["value"])
         unit = request.form["unit"]
         results = time_convert(value, unit)
-    return render_template("time.html", results=results)
+    return render_calc("time.html", "time_result.html", {"results": results})
 
 
 @app.route("/month", methods=["GET", "POST"])
@@ -531,7 +631,9 @@ def month_calc():
         start_format = "%b %d, %Y %H:%M:%S" if show_start_time else "%b %d, %Y"
         end_format = "%b %d, %Y %H:%M:%S" if show_end_time else "%b %d, %Y"
         range_text = f"{start.strftime(start_format)} - {end.strftime(end_format)}"
-    return render_template("month.html", results=results, range_text=range_text)
+    return render_calc(
+        "month.html", "month_result.html", {"results": results, "range_text": range_text}
+    )
 
 
 @app.route("/resolution", methods=["GET", "POST"])
@@ -542,7 +644,51 @@ def resolution_calc():
         h = int(request.form["height"])
         scales = [float(x) for x in request.form["scales"].split(",")]
         results = resolution_convert(w, h, scales)
-    return render_template("resolution.html", results=results)
+    return render_calc("resolution.html", "resolution_result.html", {"results": results})
+
+
+@app.route("/resolution/renditions", methods=["POST"])
+def resolution_renditions():
+    imgconvert = plugins.module("imgconvert")
+    if imgconvert is None:
+        return render_template(
+            "resolution.html", results=None, error="Image export is unavailable right now."
+        ), 503
+
+    error = None
+    status = 400
+    headers = {}
+
+    try:
+        # before request.files, which reads the whole body
+        imgconvert.check_upload_size()
+        upload = request.files.get("image")
+        formats = [f.lower() for f in request.form.getlist("formats")] or ["png"]
+        scales = [float(x) for x in request.form["scales"].split(",")]
+        quality = max(1, min(100, int(request.form.get("quality") or 90)))
+        if not upload or not upload.filename or any(s <= 0 for s in scales):
+            raise ValueError
+
+        # decoded once in the converter pool, one zip entry per scale and format
+        return imgconvert.renditions_response(
+            upload, formats, quality, lambda w, h: resolution_convert(w, h, scales)
+        )
+    except imgconvert.PoolBusy:
+        error = "The converter is busy. Try again in a few seconds."
+        status = 429
+        headers["Retry-After"] = str(imgconvert.RETRY_AFTER)
+    except imgconvert.ImageRejected as e:
+        error = str(e)
+        status = e.status
+    except (KeyError, ValueError):
+        # missing or malformed form fields; image decode errors arrive as ImageRejected
+        error = "Choose an image and enter positive comma-separated scales."
+    except OSError:
+        app.logger.exception("renditions: cache write failed")
+        error = "Export failed. Try again in a few seconds."
+        status = 500
+
+    return render_template("resolution.html", results=None, error=error), status, headers
 
 
 @app.route("/drives", methods=["GET", "POST"])
@@ -569,11 +715,10 @@ def drives_calc():
         except Exception:
             error = "Invalid format. Use one drive per line: TB:PRICE (e.g. 8:160)"
 
-    return render_template(
+    return render_calc(
         "drives.html",
-        results=results,
-        cheapest=cheapest,
-        error=error
+        "drives_result.html",
+        {"results": results, "cheapest": cheapest, "error": error},
     )
 
 @app.route("/usable-space", methods=["GET", "POST"])
@@ -600,7 +745,9 @@ def usable_space():
         except Exception:
             error = "Enter valid positive numbers for capacity, overhead, and reserved space."
 
-    return render_template("usable_space.html", result=result, error=error)
+    return render_calc(
+        "usable_space.html", "usable_space_result.html", {"result": result, "error": error}
+    )
 
 @app.route("/power-bill", methods=["GET", "POST"])
 def power_bill():
@@ -617,10 +764,10 @@ def power_bill():
             result = power_bill_calc(wattage, provider_id)
         except Exception:
             error = "Enter a valid wattage and select a power provider."
-    return render_template(
+    return render_calc(
         "power_bill.html",
-        result=result,
-        error=error,
+        "power_bill_result.html",
+        {"result": result, "error": error},
         providers=POWER_PROVIDERS,
     )
 
@@ -628,13 +775,22 @@ def power_bill():
 @app.route("/darkmoon", methods=["GET", "POST"])
 def darkmoon():
     result = None
+    error = None
     if request.method == "POST":
-        result = darkmoon_luck_calc(
-            int(request.form["cards"]),
-            request.form["deck"],
-            request.form["difficulty"],
-        )
-    return render_template("darkmoon.html", result=result)
+        # form field or ?seed= replay link; type=int gives None for anything that isn't one
+        seed = request.values.get("seed", type=int)
+        if request.values.get("seed") and (seed is None or seed < 0):
+            error = "Seed must be a non-negative whole number."
+        else:
+            result = darkmoon_luck_calc(
+                int(request.form["cards"]),
+                request.form["deck"],
+                request.form["difficulty"],
+                seed,
+            )
+    return render_calc(
+        "darkmoon.html", "darkmoon_result.html", {"result": result, "error": error}
+    )
 
 @app.route("/deathroll")
 def deathroll():
@@ -642,7 +798,17 @@ def deathroll():
 
 @app.route("/deathroll-pvp")
 def deathroll_pvp():
-    return render_template("deathroll_pvp.html")
+    return render_template("deathroll_pvp.html", wire=wire.client_config())
+
+@app.route("/deathroll/odds")
+def deathroll_odds_api():
+    try:
+        max_roll = int(request.args.get("max", 1000))
+        if max_roll < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "max must be a positive integer"}), 400
+    return jsonify(deathroll_odds(max_roll))
 
 @app.route("/blackjack")
 def blackjack():
@@ -650,72 +816,117 @@ def blackjack():
 
 @app.route("/blackjack-pvp")
 def blackjack_pvp():
-    return render_template("blackjack_pvp.html")
+    return render_template("blackjack_pvp.html", wire=wire.client_config())
+
+@app.route("/blackjack/advice")
+def blackjack_advice():
+    try:
+        hand = [r.strip().upper() for r in request.args["hand"].split(",") if r.strip()]
+        opp = [r.strip().upper() for r in request.args.get("opp", "").split(",") if r.strip()]
+        if len(hand) < 2:
+            raise ValueError
+        return jsonify(bj_strategy.advise(hand, opp))
+    except (KeyError, ValueError):
+        return jsonify({"error": "Pass hand=A,7 and opp=10,9 (ranks A, 2-10, J, Q, K)."}), 400
 
 @socketio.on("queue")
+@admission.admit("queue", notice="system")
 def handle_queue():
     sid = request.sid
 
-    # prevent double-queue
-    if sid in pvp_queue:
-        emit("system", "Already queued.")
-        return
+    with matchmaking_lock:
+        # prevent double-queue
+        if sid in pvp_queue:
+            emit("system", "Already queued.")
+            return
 
-    # prevent re-queue while in match
-    if sid in sid_to_room:
-        emit("system", "You are already in a match.")
-        return
+        # prevent re-queue while in match
+        if sid in sid_to_room:
+            emit("system", "You are already in a match.")
+            return
+
+        pvp_queue.append(sid)
+        match_log.append(0, eventlog.QUEUE, a=eventlog.DEATHROLL)
+        analytics.player("deathroll", sid_to_player.get(sid, sid))
+        lobby.mark(DEATHROLL_QUEUE)
+        emit("system", "Queued. Waiting for opponent...")
 
-    pvp_queue.append(sid)
-    emit("system", "Queued. Waiting for opponent...")
+        if len(pvp_queue) < 2:
+            return
 
-    if len(pvp_queue) >= 2:
         p1 = pvp_queue.pop(0)
         p2 = pvp_queue.pop(0)
+        lobby.mark(DEATHROLL_QUEUE)
 
         room = f"room-{p1[:5]}-{p2[:5]}"
-        pvp_rooms[room] = {
+        game = {
             "players": [p1, p2],
             "bet": {},
             "max": 1000,
             "turn": p1,
             "finished": False,
+            "rng": RandomStream(),
+            "match_id": match_log.new_match(),
+            "rolls": 0,
         }
-
+        pvp_rooms[room] = game
         sid_to_room[p1] = room
         sid_to_room[p2] = room
 
-        join_room(room, sid=p1)
-        join_room(room, sid=p2)
+    match_log.append(game["match_id"], eventlog.START, a=game["rng"].seed, b=eventlog.DEATHROLL)
+
+    join_room(room, sid=p1)
+    join_room(room, sid=p2)
 
-        # tell each client who they are
-        socketio.emit("role", "PlayerA", to=p1)
-        socketio.emit("role", "PlayerB", to=p2)
+    # tell each client who they are
+    socketio.emit("role", "PlayerA", to=p1)
+    socketio.emit("role", "PlayerB", to=p2)
 
-        emit("system", "Match found! Agree on a bet.", to=room)
+    emit("system", "Match found! Agree on a bet.", to=room)
+    socketio.emit("odds", wire.pack("odds", deathroll_odds(game["max"])), to=room)
 
 
 @socketio.on("bet")
+@admission.admit("game", notice="system")
 def handle_bet(amount):
     sid = request.sid
+    room = sid_to_room.get(sid)
+    if not room:
+        return
 
-    for room, game in pvp_rooms.items():
-        if sid in game["players"]:
-            game["bet"][sid] = amount
-
-            emit("system", f"Bet set: {amount}g", to=room)
+    with room_locks(room):
+        game = pvp_rooms.get(room)
+        if not game or sid not in game["players"]:
+            return
 
-            if len(set(game["bet"].values())) == 1 and len(game["bet"]) == 2:
-                emit("system", "Bets locked. Type /roll 1000 to start.", to=room)
+        amount, error = _parse_bet(amount)
+        if error:
+            emit("system", error, to=sid)
             return
 
+        game["bet"][sid] = amount
+        match_log.append(game["match_id"], eventlog.BET, game["players"].index(sid), amount)
+        spectators.mark(room)
+
+        emit("system", f"Bet set: {amount}g", to=room)
+
+        if len(set(game["bet"].values())) == 1 and len(game["bet"]) == 2:
+            emit("system", "Bets locked. Type /roll 1000 to start.", to=room)
+
 @socketio.on("roll")
+@admission.admit("game", notice="system")
 def handle_roll(max_roll):
     sid = request.sid
+    room = sid_to_room.get(sid)
+    if not room or room not in pvp_rooms:
+        emit("system", "Not your turn (or you're not in a match).", to=sid)
+        return
 
-    for room, game in pvp_rooms.items():
-        if sid != game["turn"]:
-            continue
+    with room_locks(room):
+        game = pvp_rooms.get(room)
+        if not game or sid != game["turn"]:
+            emit("system", "Not your turn (or you're not in a match).", to=sid)
+            return
         if game.get("finished"):
             emit("system", "The match is over. You can keep chatting here.", to=sid)
             return
@@ -729,32 +940,56 @@ def handle_roll(max_roll):
             emit("system", f"Invalid roll. You must /roll {game['max']}.", to=sid)
             return
 
-        roll = random.randint(1, int(max_roll))
+        roll = game["rng"].randint(1, int(max_roll))
         players = game["players"]
+        match_log.append(game["match_id"], eventlog.ROLL, players.index(sid), roll, int(max_roll))
+        game["rolls"] += 1
         label = "PlayerA" if sid == players[0] else "PlayerB"
         emit("chat", f"{label} rolled {roll} (1–{max_roll})", to=room)
+        game["last_roll"] = {"by": label, "roll": roll, "max": int(max_roll)}
+        spectators.mark(room)
 
         if roll == 1:
-            loser_role = label
-            winner_role = "PlayerB" if label == "PlayerA" else "PlayerA"
-
-            bet_values = list(game.get("bet", {}).values())
-            bet = bet_values[0] if len(bet_values) == 2 and len(set(bet_values)) == 1 else 0
-
             emit("system", f"{label} loses the deathroll.", to=room)
-            socketio.emit("result", {"winner": winner_role, "loser": loser_role, "bet": bet}, to=room)
-            game["finished"] = True
+            _deathroll_settle(room, game, sid)
             return
 
         game["max"] = roll
         game["turn"] = next(p for p in players if p != sid)
-        return
-
-    # If we didn't find a match where it's your turn:
-    emit("system", "Not your turn (or you're not in a match).", to=sid)
+        socketio.emit("odds", wire.pack("odds", deathroll_odds(roll)), to=room)
+
+
+def _deathroll_locked_bet(game):
+    bet_values = list(game.get("bet", {}).values())
+    return bet_values[0] if len(bet_values) == 2 and len(set(bet_values)) == 1 else 0
+
+
+def _deathroll_settle(room, game, loser):
+    """Pay out a match `loser` lost, by rolling a 1 or by walking out. Caller holds the room lock."""
+    players = game["players"]
+    loser_seat = players.index(loser)
+    loser_role = "PlayerA" if loser_seat == 0 else "PlayerB"
+    winner_role = "PlayerB" if loser_seat == 0 else "PlayerA"
+    bet = _deathroll_locked_bet(game)
+
+    match_log.append(game["match_id"], eventlog.RESULT, 1 - loser_seat, bet)
+    match_log.append(game["match_id"], eventlog.RESULT, loser_seat, -bet)
+    # the seed is only revealed once the match is over, so the rolls can be replayed
+    socketio.emit("result", wire.pack("result", {
+        "winner": winner_role,
+        "loser": loser_role,
+        "bet": bet,
+        "seed": game["rng"].seed,
+    }), to=room)
+    winner = players[1 - loser_seat] if len(players) == 2 else None
+    _ledger_settle("deathroll", game["match_id"], {winner: bet, loser: -bet})
+    analytics.match("deathroll", game["rolls"])
+    analytics.bet("deathroll", bet)
+    game["finished"] = True
 
 
 @socketio.on("chat")
+@admission.admit("chat", notice="system")
 def on_chat(msg):
     sid = request.sid
     room = sid_to_room.get(sid)
@@ -775,100 +1010,207 @@ def on_chat(msg):
 @socketio.on("disconnect")
 def on_disconnect():
     sid = request.sid
+    spectators.unwatch(sid, leave=False)
+    lobby.unsubscribe(sid, leave=False)
     
     # Clean up deathroll queue and rooms
-    if sid in pvp_queue:
-        pvp_queue.remove(sid)
+    with matchmaking_lock:
+        if sid in pvp_queue:
+            pvp_queue.remove(sid)
+            lobby.mark(DEATHROLL_QUEUE)
+        room = sid_to_room.pop(sid, None)
+
+    if room:
+        with room_locks(room):
+            game = pvp_rooms.get(room)
+            if game:
+                players = game.get("players", [])
+                label = "PlayerA" if players and sid == players[0] else "PlayerB"
+
+                leave_room(room, sid=sid)
+                emit("system", f"{label} leaves the instance.", to=room)
+
+                # walking out once the bets are locked loses the match, like rolling a 1
+                if (not game["finished"] and len(players) == 2 and sid in players
+                        and _deathroll_locked_bet(game)):
+                    emit("system", f"{label} forfeits the deathroll.", to=room)
+                    match_log.append(game["match_id"], eventlog.LEAVE, players.index(sid))
+                    _deathroll_settle(room, game, sid)
+
+                if sid in players:
+                    players.remove(sid)
+                if not players:
+                    with matchmaking_lock:
+                        pvp_rooms.pop(room, None)
+                spectators.mark(room)
+    
+    # Clean up blackjack queue and rooms
+    with matchmaking_lock:
+        if sid in bj_queue:
+            bj_queue.remove(sid)
+        bj_room = bj_sid_to_room.pop(sid, None)
 
-    room = sid_to_room.pop(sid, None)
-    if room and room in pvp_rooms:
-        game = pvp_rooms[room]
-        players = game.get("players", [])
-        label = "PlayerA" if players and sid == players[0] else "PlayerB"
+    if bj_room:
+        with room_locks(bj_room):
+            game = bj_rooms.get(bj_room)
+            if game:
+                _bj_leave(bj_room, game, sid)
+
+    # outside the room lock: filling seats takes other rooms' locks
+    _bj_fill_seats()
+    sid_to_player.pop(sid, None)
+    admission.forget(sid)
 
-        leave_room(room, sid=sid)
-        emit("system", f"{label} leaves the instance.", to=room)
 
-        if sid in players:
-            players.remove(sid)
-        if not players:
-            pvp_rooms.pop(room, None)
+def _bj_leave(room, game, sid):
+    label = _bj_role(game, sid)
     
-    # Clean up blackjack queue and rooms
-    if sid in bj_queue:
-        bj_queue.remove(sid)
+    leave_room(room, sid=sid)
+    emit("bj_system", f"{label} disconnected.", to=room)
     
-    bj_room = bj_sid_to_room.pop(sid, None)
-    if bj_room and bj_room in bj_rooms:
-        game = bj_rooms[bj_room]
-        players = game.get("players", [])
-        
-        p1, p2 = players if len(players) == 2 else (None, None)
-        label = "P1" if p1 and sid == p1 else "P2"
-        
-        leave_room(bj_room, sid=sid)
-        emit("bj_system", f"{label} disconnected.", to=bj_room)
-        
-        # If the other player is still there, clean up their mapping too
-        if sid in players:
-            players.remove(sid)
-        if not players:
-            bj_rooms.pop(bj_room, None)
+    # A hand in progress carries on without the leaver, whose hand is forfeit:
+    # it is scored as a bust, so walking out of a losing hand still costs the stake
+    if game["in_round"] and sid in game["hands"]:
+        game["forfeits"][sid] = {
+            "seat": game["seats"].index(sid),
+            "value": _bj_hand_value(game["hands"][sid]),
+            "player": sid_to_player.get(sid),
+        }
+        game["done"][sid] = True
+        if game["active"] == sid:
+            game["active"] = _bj_next_active(game, sid)
+        del game["hands"][sid]
+        del game["done"][sid]
+        if game["active"] is None or len(game["hands"]) < 2:
+            bj_finish(room)
+        else:
+            _bj_emit_state(room, game)
+
+    game["seats"][game["seats"].index(sid)] = None
+    game["bet"].pop(sid, None)
+    game["series"]["wins"].pop(sid, None)
+
+    spectators.mark(room)
+    lobby.mark(room)
+    with matchmaking_lock:
+        if not _bj_seated(game):
+            bj_rooms.pop(room, None)
+            bj_open_rooms.discard(room)
+        elif not game["finished"] and not game["in_round"]:
+            bj_open_rooms.add(room)
 
 
 @socketio.on("bj_queue")
+@admission.admit("queue", notice="bj_system")
 def bj_queue_up():
     sid = request.sid
 
-    if sid in bj_queue:
-        emit("bj_system", "Already queued.")
-        return
+    with matchmaking_lock:
+        if sid in bj_queue:
+            emit("bj_system", "Already queued.")
+            return
 
-    existing = bj_sid_to_room.get(sid)
-    if existing and existing in bj_rooms:
-        game = bj_rooms[existing]
-        if not game.get("finished"):
+        existing = bj_rooms.get(bj_sid_to_room.get(sid))
+        if existing and not existing.get("finished"):
             emit("bj_system", "You are already in an active Blackjack match.")
             return
-        else:
-            # Match is finished, clean up the old room mapping
-            bj_sid_to_room.pop(sid, None)
-            # Clean up the room if both players have left
-            players = game.get("players", [])
-            if all(p not in bj_sid_to_room for p in players):
-                bj_rooms.pop(existing, None)
-
-    bj_queue.append(sid)
+        _bj_drop_finished(sid)
+
+        bj_queue.append(sid)
+
+    match_log.append(0, eventlog.QUEUE, a=eventlog.BLACKJACK)
+    analytics.player("blackjack", sid_to_player.get(sid, sid))
     emit("bj_system", "Queued for Blackjack PvP. Waiting for opponent...")
+    _bj_fill_seats()
 
-    if len(bj_queue) >= 2:
-        p1 = bj_queue.pop(0)
-        p2 = bj_queue.pop(0)
 
-        room = f"bj-{p1[:5]}-{p2[:5]}"
-        bj_rooms[room] = {
-            "players": [p1, p2],
-            "bet": {},
-            "deck": [],
-            "hands": {p1: [], p2: []},
-            "done": {p1: False, p2: False},
-            "active": p1,
-            "in_round": False,
-            "finished": False,
-        }
+def _bj_drop_finished(sid):
+    """Forget sid's finished table, and the table once every player has left. Under matchmaking_lock."""
+    existing = bj_sid_to_room.get(sid)
+    game = bj_rooms.get(existing)
+    if not game or not game.get("finished"):
+        return
+    bj_sid_to_room.pop(sid, None)
+    if all(p not in bj_sid_to_room for p in _bj_seated(game)):
+        bj_rooms.pop(existing, None)
+
 
-        bj_sid_to_room[p1] = room
-        bj_sid_to_room[p2] = room
+def _bj_seated(game):
+    return [p for p in game["seats"] if p]
 
-        join_room(room, sid=p1)
-        join_room(room, sid=p2)
 
-        socketio.emit("bj_role", "P1", to=p1)
-        socketio.emit("bj_role", "P2", to=p2)
-        emit("bj_system", "Match found! Both players set the same bet, then Deal.", to=room)
+def _bj_role(game, sid):
+    return f"P{game['seats'].index(sid) + 1}"
+
+
+def _bj_fill_seats():
+    """Seat queued players. Must be called without holding a room lock."""
+    # open seats at existing tables first, then new tables for whoever is left
+    for room in list(bj_open_rooms):
+        if not bj_queue:
+            return
+        joined = []
+        with room_locks(room):
+            game = bj_rooms.get(room)
+            with matchmaking_lock:
+                if not game or game["finished"] or game["in_round"]:
+                    bj_open_rooms.discard(room)
+                    lobby.mark(room)
+                    continue
+                while bj_queue and None in game["seats"]:
+                    sid = bj_queue.pop(0)
+                    _bj_seat(room, game, sid)
+                    joined.append(sid)
+                if None not in game["seats"]:
+                    bj_open_rooms.discard(room)
+            for sid in joined:
+                emit("bj_system", f"{_bj_role(game, sid)} joins the table. Set the same bet, then Deal.", to=room)
+
+    while len(bj_queue) >= 2:
+        with matchmaking_lock:
+            if len(bj_queue) < 2:
+                return
+            batch = bj_queue[:BJ_MAX_SEATS]
+            del bj_queue[:BJ_MAX_SEATS]
+
+            room = f"bj-{batch[0][:5]}-{batch[1][:5]}"
+            game = {
+                "seats": [None] * BJ_MAX_SEATS,
+                "bet": {},
+                "deck": [],
+                "cut": 0,
+                "series": {"hand": 0, "wins": {}},
+                "hands": {},
+                "done": {},
+                "active": None,
+                "stake": 0,
+                "forfeits": {},     # sid -> seat, value and player id of a hand left mid-round
+                "in_round": False,
+                "finished": False,
+                "rng": RandomStream(),
+                "match_id": match_log.new_match(),
+            }
+            for sid in batch:
+                _bj_seat(room, game, sid)
+            bj_rooms[room] = game
+            if None in game["seats"]:
+                bj_open_rooms.add(room)
+
+        match_log.append(game["match_id"], eventlog.START, a=game["rng"].seed, b=eventlog.BLACKJACK)
+        emit("bj_system", "Match found! Everyone sets the same bet, then Deal.", to=room)
+
+
+def _bj_seat(room, game, sid):
+    seat = game["seats"].index(None)
+    game["seats"][seat] = sid
+    bj_sid_to_room[sid] = room
+    join_room(room, sid=sid)
+    socketio.emit("bj_role", f"P{seat + 1}", to=sid)
+    lobby.mark(room)
 
 
 @socketio.on("bj_bet")
+@admission.admit("game", notice="bj_system")
 def bj_set_bet(amount):
     sid = request.sid
     room = bj_sid_to_room.get(sid)
@@ -876,30 +1218,39 @@ def bj_set_bet(amount):
         emit("bj_system", "You are not in a Blackjack match.")
         return
 
-    game = bj_rooms[room]
-    if game.get("finished"):
-        emit("bj_system", "Match is over. Queue again to play.", to=sid)
-        return
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        if not game:
+            return
+        if game.get("finished"):
+            emit("bj_system", "Match is over. Queue again to play.", to=sid)
+            return
 
-    try:
-        amount = int(amount)
-    except Exception:
-        emit("bj_system", "Invalid bet amount.", to=sid)
-        return
+        amount, error = _parse_bet(amount)
+        if error:
+            emit("bj_system", error, to=sid)
+            return
 
-    if amount <= 0:
-        emit("bj_system", "Bet must be greater than 0.", to=sid)
-        return
+        game["bet"][sid] = amount
+        match_log.append(game["match_id"], eventlog.BET, game["seats"].index(sid), amount)
+        lobby.mark(room)
+        emit("bj_system", f"{_bj_role(game, sid)} bets {amount} Diamonds.", to=room)
+
+        if _bj_locked_bet(game):
+            emit("bj_system", "Bets locked. Click Deal.", to=room)
 
-    game["bet"][sid] = amount
-    emit("bj_system", f"Bet set: {amount} Diamonds.", to=room)
 
-    vals = list(game["bet"].values())
-    if len(vals) == 2 and len(set(vals)) == 1:
-        emit("bj_system", "Bets locked. Click Deal.", to=room)
+def _bj_locked_bet(game):
+    """The agreed bet once every seated player has bet the same amount, else None."""
+    seated = _bj_seated(game)
+    vals = {game["bet"].get(p) for p in seated}
+    if len(seated) < 2 or len(vals) != 1 or None in vals:
+        return None
+    return vals.pop()
 
 
 @socketio.on("bj_chat")
+@admission.admit("chat", notice="bj_system")
 def bj_chat(msg):
     sid = request.sid
     room = bj_sid_to_room.get(sid)
@@ -908,14 +1259,13 @@ def bj_chat(msg):
         return
     
     game = bj_rooms[room]
-    p1, p2 = game["players"]
-    role = "P1" if sid == p1 else "P2"
+    role = _bj_role(game, sid)
     
-    # Broadcast the chat message to both players
+    # Broadcast the chat message to the whole table
     socketio.emit("bj_chat", {"role": role, "msg": msg}, to=room)
 
 
-def _bj_create_deck():
+def _bj_create_deck(rng, decks=1):
     suits = ["♠", "♥", "♦", "♣"]
     ranks = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
     deck = []
@@ -923,10 +1273,16 @@ def _bj_create_deck():
         for r in ranks:
             v = 11 if r == "A" else 10 if r in ("J", "Q", "K") else int(r)
             deck.append({"r": r, "s": s, "v": v, "label": f"{r}{s}"})
-    random.shuffle(deck)
+    deck *= decks  # cards are never mutated, so the decks can share them
+    rng.shuffle(deck)
     return deck
 
 
+def _bj_new_shoe(game):
+    game["deck"] = _bj_create_deck(game["rng"], BJ_SHOE_DECKS)
+    game["cut"] = int(len(game["deck"]) * (1 - BJ_PENETRATION))
+
+
 def _bj_hand_value(hand):
     total = sum(c["v"] for c in hand)
     aces = sum(1 for c in hand if c["r"] == "A")
@@ -936,7 +1292,49 @@ def _bj_hand_value(hand):
     return total
 
 
+def _bj_next_active(game, sid):
+    """Next seat around the ring (ending back at sid) that is still playing, or None."""
+    seats = game["seats"]
+    start = seats.index(sid)
+    for step in range(1, len(seats) + 1):
+        p = seats[(start + step) % len(seats)]
+        if p in game["hands"] and not game["done"][p]:
+            return p
+    return None
+
+
+def _bj_state(game):
+    seats = []
+    for p in game["seats"]:
+        if p in game["hands"]:
+            hand = game["hands"][p]
+            seats.append({
+                "role": _bj_role(game, p),
+                "cards": [c["label"] for c in hand],
+                "v": _bj_hand_value(hand),
+                "done": game["done"][p],
+            })
+    return {
+        "active": _bj_role(game, game["active"]) if game["active"] else None,
+        "seats": seats,
+        "bet": _bj_locked_bet(game) or 0,
+        "in_round": game["in_round"],
+        "hand": game["series"]["hand"],
+        "of": BJ_SERIES_HANDS,
+        "shoe": len(game["deck"]),
+    }
+
+
+def _bj_emit_state(room, game, note=None):
+    # one emit carries the whole table, so every action costs a single broadcast
+    state = _bj_state(game)
+    state["note"] = note
+    socketio.emit("bj_state", wire.pack("bj_state", state), to=room)
+    spectators.mark(room)
+
+
 @socketio.on("bj_deal")
+@admission.admit("game", notice="bj_system")
 def bj_deal():
     sid = request.sid
     room = bj_sid_to_room.get(sid)
@@ -944,43 +1342,88 @@ def bj_deal():
         emit("bj_system", "You are not in a Blackjack match.")
         return
 
-    game = bj_rooms[room]
-    if game.get("finished"):
-        emit("bj_system", "Match is over. Queue again to play.", to=sid)
-        return
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        if not game:
+            return
+        if game.get("finished"):
+            emit("bj_system", "Match is over. Queue again to play.", to=sid)
+            return
 
-    # Require locked bets
-    vals = list(game.get("bet", {}).values())
-    if len(vals) < 2 or len(set(vals)) != 1:
-        emit("bj_system", "Both players must set the same bet before dealing.", to=sid)
-        return
+        # Require locked bets
+        if not _bj_locked_bet(game):
+            emit("bj_system", "Every seated player must set the same bet before dealing.", to=sid)
+            return
+
+        if game["in_round"]:
+            emit("bj_system", "Round already in progress.", to=sid)
+            return
 
-    if game["in_round"]:
-        emit("bj_system", "Round already in progress.", to=sid)
+        # the shoe carries over between hands until the cut card comes out
+        note = ""
+        if len(game["deck"]) <= game["cut"]:
+            _bj_new_shoe(game)
+            note = "Fresh shoe shuffled. "
+
+        seated = _bj_seated(game)
+        game["hands"] = {p: [game["deck"].pop(), game["deck"].pop()] for p in seated}
+        game["done"] = {p: False for p in seated}
+        # the stake is fixed at the deal, so leaving or re-betting mid-hand can't change it
+        game["stake"] = _bj_locked_bet(game)
+        game["forfeits"] = {}
+        game["active"] = seated[0]
+        game["in_round"] = True
+        game["series"]["hand"] += 1
+        with matchmaking_lock:
+            bj_open_rooms.discard(room)
+        lobby.mark(room)
+        for p in seated:
+            first, second = game["hands"][p]
+            match_log.append(
+                game["match_id"], eventlog.DEAL, game["seats"].index(p),
+                eventlog.card_code(first), eventlog.card_code(second),
+            )
+
+        hand_no = game["series"]["hand"]
+        _bj_emit_state(
+            room, game,
+            f"{note}Hand {hand_no} of {BJ_SERIES_HANDS}. {_bj_role(game, seated[0])} acts first.",
+        )
+
+
+@socketio.on("bj_advice")
+@admission.admit("game", notice="bj_system")
+def bj_advice():
+    sid = request.sid
+    room = bj_sid_to_room.get(sid)
+    if not room or room not in bj_rooms:
+        emit("bj_system", "You are not in a Blackjack match.")
         return
 
-    p1, p2 = game["players"]
-    game["deck"] = _bj_create_deck()
-    game["hands"] = {p1: [game["deck"].pop(), game["deck"].pop()],
-                     p2: [game["deck"].pop(), game["deck"].pop()]}
-    game["done"] = {p1: False, p2: False}
-    game["active"] = p1
-    game["in_round"] = True
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        if not game:
+            return
+        if not game["in_round"] or game["done"].get(sid, True):
+            emit("bj_system", "No hand to advise on.", to=sid)
+            return
 
-    socketio.emit("bj_state", {
-        "active": "P1",
-        "p1": [c["label"] for c in game["hands"][p1]],
-        "p2": [c["label"] for c in game["hands"][p2]],
-        "p1v": _bj_hand_value(game["hands"][p1]),
-        "p2v": _bj_hand_value(game["hands"][p2]),
-        "bet": vals[0],
-        "in_round": True,
-    }, to=room)
+        # advise against the strongest hand still standing at the table
+        others = [game["hands"][p] for p in game["hands"] if p != sid]
+        standing = [h for h in others if _bj_hand_value(h) <= 21] or others
+        best = max(standing, key=_bj_hand_value)
 
-    emit("bj_system", "Cards dealt. P1 acts first.", to=room)
+        # every card missing from the deck is face up, so this reveals nothing hidden
+        advice = bj_strategy.advise(
+            [c["r"] for c in game["hands"][sid]],
+            [c["r"] for c in best],
+            bj_strategy.shoe_counts(game["deck"]),
+        )
+        emit("bj_advice", advice, to=sid)
 
 
 @socketio.on("bj_hit")
+@admission.admit("game", notice="bj_system")
 def bj_hit():
     sid = request.sid
     room = bj_sid_to_room.get(sid)
@@ -988,50 +1431,46 @@ def bj_hit():
         emit("bj_system", "You are not in a Blackjack match.")
         return
 
-    game = bj_rooms[room]
-    if not game["in_round"]:
-        emit("bj_system", "No active round. Click Deal.", to=sid)
-        return
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        if not game:
+            return
+        if not game["in_round"]:
+            emit("bj_system", "No active round. Click Deal.", to=sid)
+            return
 
-    if sid != game["active"]:
-        emit("bj_system", "Not your turn.", to=sid)
-        return
+        if sid != game["active"]:
+            emit("bj_system", "Not your turn.", to=sid)
+            return
 
-    if not game["deck"]:
-        game["deck"] = _bj_create_deck()
+        if not game["deck"]:
+            _bj_new_shoe(game)
 
-    game["hands"][sid].append(game["deck"].pop())
-    total = _bj_hand_value(game["hands"][sid])
+        card = game["deck"].pop()
+        game["hands"][sid].append(card)
+        total = _bj_hand_value(game["hands"][sid])
+        match_log.append(
+            game["match_id"], eventlog.HIT, game["seats"].index(sid), eventlog.card_code(card), total
+        )
 
-    # Bust -> mark done and switch
-    if total > 21:
-        game["done"][sid] = True
+        # Bust -> mark done
+        if total > 21:
+            game["done"][sid] = True
 
-    # Switch to the other player if possible
-    p1, p2 = game["players"]
-    other = p2 if sid == p1 else p1
-    if not game["done"].get(other, False):
-        game["active"] = other
-    else:
-        game["active"] = sid  # other is done, keep here
+        # Pass the turn around the ring; stays here if everyone else is done
+        game["active"] = _bj_next_active(game, sid)
 
-    # If both done -> finish
-    if game["done"][p1] and game["done"][p2]:
-        bj_finish(room)
-        return
+        # If everyone is done -> finish
+        if game["active"] is None:
+            bj_finish(room)
+        else:
+            _bj_emit_state(room, game)
 
-    socketio.emit("bj_state", {
-        "active": "P1" if game["active"] == p1 else "P2",
-        "p1": [c["label"] for c in game["hands"][p1]],
-        "p2": [c["label"] for c in game["hands"][p2]],
-        "p1v": _bj_hand_value(game["hands"][p1]),
-        "p2v": _bj_hand_value(game["hands"][p2]),
-        "bet": list(game["bet"].values())[0],
-        "in_round": True,
-    }, to=room)
+    _bj_fill_seats()
 
 
 @socketio.on("bj_stand")
+@admission.admit("game", notice="bj_system")
 def bj_stand():
     sid = request.sid
     room = bj_sid_to_room.get(sid)
@@ -1039,35 +1478,55 @@ def bj_stand():
         emit("bj_system", "You are not in a Blackjack match.")
         return
 
-    game = bj_rooms[room]
-    if not game["in_round"]:
-        emit("bj_system", "No active round. Click Deal.", to=sid)
-        return
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        if not game:
+            return
+        if not game["in_round"]:
+            emit("bj_system", "No active round. Click Deal.", to=sid)
+            return
 
-    if sid != game["active"]:
-        emit("bj_system", "Not your turn.", to=sid)
-        return
+        if sid != game["active"]:
+            emit("bj_system", "Not your turn.", to=sid)
+            return
 
-    game["done"][sid] = True
+        game["done"][sid] = True
+        match_log.append(
+            game["match_id"], eventlog.STAND, game["seats"].index(sid),
+            _bj_hand_value(game["hands"][sid]),
+        )
 
-    p1, p2 = game["players"]
-    other = p2 if sid == p1 else p1
-    if not game["done"].get(other, False):
-        game["active"] = other
+        game["active"] = _bj_next_active(game, sid)
 
-    if game["done"][p1] and game["done"][p2]:
-        bj_finish(room)
-        return
+        if game["active"] is None:
+            bj_finish(room)
+        else:
+            _bj_emit_state(room, game)
 
-    socketio.emit("bj_state", {
-        "active": "P1" if game["active"] == p1 else "P2",
-        "p1": [c["label"] for c in game["hands"][p1]],
-        "p2": [c["label"] for c in game["hands"][p2]],
-        "p1v": _bj_hand_value(game["hands"][p1]),
-        "p2v": _bj_hand_value(game["hands"][p2]),
-        "bet": list(game["bet"].values())[0],
-        "in_round": True,
-    }, to=room)
+    _bj_fill_seats()
+
+
+def _bj_payouts(values, bet):
+    """
+    values: {player: hand total} for everyone dealt in
+    returns: (winners, {player: delta})
+    Best non-bust total wins; losers each pay the bet and winners split the pot.
+    """
+    scores = {p: 0 if v > 21 else v for p, v in values.items()}
+    best = max(scores.values())
+    winners = [p for p, sc in scores.items() if sc == best and best > 0]
+    losers = [p for p in scores if p not in winners]
+
+    deltas = {p: 0 for p in values}
+    if not winners or not losers:
+        return [], deltas
+
+    share, extra = divmod(bet * len(losers), len(winners))
+    for i, p in enumerate(winners):
+        deltas[p] = share + (1 if i < extra else 0)
+    for p in losers:
+        deltas[p] = -bet
+    return winners, deltas
 
 
 def bj_finish(room):
@@ -1075,53 +1534,279 @@ def bj_finish(room):
     if not game:
         return
 
-    p1, p2 = game["players"]
-    p1v = _bj_hand_value(game["hands"][p1])
-    p2v = _bj_hand_value(game["hands"][p2])
-    bet = list(game["bet"].values())[0]
-
-    def score(v):  # bust -> 0
-        return 0 if v > 21 else v
-
-    s1, s2 = score(p1v), score(p2v)
+    order = [p for p in game["seats"] if p in game["hands"]]
+    values = {p: _bj_hand_value(game["hands"][p]) for p in order}
+    forfeits = game["forfeits"]
+    bet = game["stake"]
+    winners, deltas = _bj_payouts({**values, **{p: 22 for p in forfeits}}, bet)
+    role_of = {p: _bj_role(game, p) for p in order}
+    role_of.update((p, f"P{f['seat'] + 1}") for p, f in forfeits.items())
+
+    # Determine reason
+    if not winners and values and all(v > 21 for v in values.values()):
+        reason = "Everyone busts!"
+    elif not winners:
+        reason = f"Push at {next(iter(values.values()), 0)}."
+    elif len(winners) == 1:
+        w = winners[0]
+        reason = f"{_bj_role(game, w)} wins with {values[w]}."
+    else:
+        roles = ", ".join(_bj_role(game, w) for w in winners)
+        reason = f"{roles} split the pot at {values[winners[0]]}."
+
+    for p in order:
+        match_log.append(game["match_id"], eventlog.RESULT, game["seats"].index(p), deltas[p], values[p])
+    for p, f in forfeits.items():
+        match_log.append(game["match_id"], eventlog.RESULT, f["seat"], deltas[p], f["value"])
+        reason += f" {role_of[p]} left mid-hand and forfeits."
+
+    series = game["series"]
+    for w in winners:
+        series["wins"][w] = series["wins"].get(w, 0) + 1
+    standings = {_bj_role(game, p): series["wins"].get(p, 0) for p in _bj_seated(game)}
+    most = max(standings.values(), default=0)
+    over = series["hand"] >= BJ_SERIES_HANDS or most > BJ_SERIES_HANDS // 2
 
-    winner = None
-    reason = ""
-    
-    # Determine winner and reason
-    if p1v > 21 and p2v > 21:
-        # Both bust
-        reason = "Both players bust!"
-        winner = None
-    elif p1v > 21:
-        # P1 busts, P2 wins
-        reason = f"P1 busts with {p1v}. P2 wins!"
-        winner = "P2"
-    elif p2v > 21:
-        # P2 busts, P1 wins
-        reason = f"P2 busts with {p2v}. P1 wins!"
-        winner = "P1"
-    elif s1 > s2:
-        # P1 has higher score
-        reason = f"P1 ({p1v}) beats P2 ({p2v})."
-        winner = "P1"
-    elif s2 > s1:
-        # P2 has higher score
-        reason = f"P2 ({p2v}) beats P1 ({p1v})."
-        winner = "P2"
+    game["in_round"] = False
+    game["active"] = None
+    if over:
+        game["finished"] = True
+        with matchmaking_lock:
+            bj_open_rooms.discard(room)
+        leaders = [r for r, n in standings.items() if n == most]
+        reason += f" Series over: {', '.join(leaders)} with {most} of {series['hand']} hands."
+        reason += " Queue again for a new table."
     else:
-        # Tie
-        reason = f"Push at {p1v}."
-        winner = None
+        reason += f" Hand {series['hand']} of {BJ_SERIES_HANDS} done. Click Deal for the next hand."
 
     # Send the result with reason
-    emit("bj_system", reason, to=room)
-    socketio.emit("bj_result", {"winner": winner, "bet": bet, "p1v": p1v, "p2v": p2v}, to=room)
-    game["in_round"] = False
-    game["finished"] = True
-    emit("bj_system", "Round finished. Queue again for a new opponent.", to=room)
+    socketio.emit("bj_result", wire.pack("bj_result", {
+        "winner": _bj_role(game, winners[0]) if len(winners) == 1 else None,
+        "winners": [_bj_role(game, w) for w in winners],
+        "bet": bet,
+        "values": {role_of[p]: values[p] if p in values else forfeits[p]["value"] for p in role_of},
+        "payouts": {role_of[p]: deltas[p] for p in role_of},
+        "series": standings,
+        "hand": series["hand"],
+        "series_over": over,
+        "reason": reason,
+        # the shoe outlives the hand, so its seed stays secret until the series ends
+        "seed": game["rng"].seed if over else None,
+    }), to=room)
+
+    spectators.mark(room)
+    lobby.mark(room)
+    _ledger_settle("blackjack", game["match_id"], deltas,
+                   players={p: f["player"] for p, f in forfeits.items()})
+    game["forfeits"] = {}
+    analytics.bet("blackjack", bet)
+    if over:
+        analytics.match("blackjack", series["hand"])
+
+    # seats freed during the hand can be filled before the next deal; the
+    # caller seats the queue once it has released the room lock
+    if not over and None in game["seats"]:
+        with matchmaking_lock:
+            bj_open_rooms.add(room)
+
+
+# ---------------- Spectators ----------------
+
+def _spectate_snapshot(room):
+    with room_locks(room):
+        return _spectate_state(room)
+
+
+def _spectate_state(room):
+    if room in pvp_rooms:
+        game = pvp_rooms[room]
+        players = game["players"]
+        bets = list(game["bet"].values())
+        return {
+            "game": "deathroll",
+            "room": room,
+            "players": len(players),
+            "turn": "PlayerA" if players and game["turn"] == players[0] else "PlayerB",
+            "max": game["max"],
+            "bet": bets[0] if len(bets) == 2 and len(set(bets)) == 1 else None,
+            "last_roll": game.get("last_roll"),
+            "finished": game["finished"],
+        }
+    if room in bj_rooms:
+        game = bj_rooms[room]
+        snap = _bj_state(game)
+        snap.update({"game": "blackjack", "room": room, "finished": game["finished"]})
+        return snap
+    return None
+
+
+spectators = Spectators(socketio, _spectate_snapshot)
+
+
+@socketio.on("spectate_list")
+@admission.admit("watch")
+def spectate_list():
+    rooms = [
+        {"room": r, "game": "deathroll", "watchers": spectators.watchers(r)}
+        for r, g in list(pvp_rooms.items()) if not g["finished"]
+    ] + [
+        {"room": r, "game": "blackjack", "watchers": spectators.watchers(r)}
+        for r, g in list(bj_rooms.items()) if not g["finished"]
+    ]
+    rooms.sort(key=lambda r: r["watchers"], reverse=True)
+    emit("spectate_list", rooms[:50])
+
+
+@socketio.on("spectate")
+@admission.admit("watch")
+def spectate(room):
+    if not isinstance(room, str):
+        return
+    if room not in pvp_rooms and room not in bj_rooms:
+        emit("spectate", {"room": room, "ended": True})
+        return
+    spectators.watch(request.sid, room)
+
+
+@socketio.on("spectate_stop")
+@admission.admit("watch")
+def spectate_stop():
+    spectators.unwatch(request.sid)
+
+
+# ---------------- Lobby ----------------
+
+DEATHROLL_QUEUE = "deathroll-queue"  # deathroll pairs FIFO, so its only open "table" is the queue
+
+
+def _lobby_entry(room):
+    if room == DEATHROLL_QUEUE:
+        waiting = len(pvp_queue)
+        return {"room": room, "game": "deathroll", "waiting": waiting} if waiting else None
+
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        if not game or room not in bj_open_rooms or game["finished"] or game["in_round"]:
+            return None
+        return {
+            "room": room,
+            "game": "blackjack",
+            "seats": len(_bj_seated(game)),
+            "max_seats": BJ_MAX_SEATS,
+            "bet": _bj_locked_bet(game),
+            "hand": game["series"]["hand"],
+            "of": BJ_SERIES_HANDS,
+        }
+
 
+lobby = Lobby(socketio, _lobby_entry)
+
+
+@socketio.on("lobby")
+@admission.admit("watch")
+def lobby_subscribe():
+    lobby.subscribe(request.sid)
+
+
+@socketio.on("lobby_stop")
+@admission.admit("watch")
+def lobby_unsubscribe():
+    lobby.unsubscribe(request.sid)
+
+
+@socketio.on("bj_join")
+@admission.admit("queue", notice="bj_system")
+def bj_join(room):
+    """Take a seat at a table picked from the lobby instead of queueing."""
+    sid = request.sid
+    if not isinstance(room, str) or room not in bj_rooms:
+        emit("bj_system", "That table is gone.")
+        return
+
+    with room_locks(room):
+        game = bj_rooms.get(room)
+        with matchmaking_lock:
+            existing = bj_rooms.get(bj_sid_to_room.get(sid))
+            if sid in bj_queue or (existing and not existing.get("finished")):
+                emit("bj_system", "You are already queued or at a table.")
+                return
+            if (not game or room not in bj_open_rooms or game["finished"]
+                    or game["in_round"] or None not in game["seats"]):
+                emit("bj_system", "That table has no open seat right now.")
+                return
+            _bj_drop_finished(sid)
+            _bj_seat(room, game, sid)
+            if None not in game["seats"]:
+                bj_open_rooms.discard(room)
+        analytics.player("blackjack", sid_to_player.get(sid, sid))
+        emit("bj_system", f"{_bj_role(game, sid)} joins the table. Set the same bet, then Deal.", to=room)
+        spectators.mark(room)
+
+
+# ---------------- Ledger / leaderboard ----------------
+
+LEDGER_GAMES = ("deathroll", "blackjack")
+PLAYER_ID = re.compile(r"[A-Za-z0-9-]{8,64}")
+
+sid_to_player = {}  # socket sid -> stable player id sent in the connect auth
+
+
+@socketio.on("connect")
+def on_connect(auth=None):
+    auth = auth if isinstance(auth, dict) else {}
+    player = auth.get("player")
+    if isinstance(player, str) and PLAYER_ID.fullmatch(player):
+        sid_to_player[request.sid] = player
+        _ledger_name(player, auth.get("name"))
+
+
+@socketio.on("set_name")
+@admission.admit("watch")
+def set_name(name):
+    player = sid_to_player.get(request.sid)
+    if player:
+        _ledger_name(player, name)
+
+
+def _ledger_name(player, name):
+    if isinstance(name, str) and name.strip():
+        ledger.set_name(player, name.strip()[:24])
+
+
+def _ledger_settle(game, match_id, deltas, players=None):
+    """
+    deltas: sid -> currency won or lost. Players who never sent an id aren't tracked.
+    players: sid -> player id for sids that may have disconnected already
+    """
+    for sid, delta in deltas.items():
+        player = sid_to_player.get(sid) or (players or {}).get(sid)
+        if not player:
+            continue
+        net = ledger.record(player, game, delta, match_id)
+        rank, board_size = ledger.rank(player, game)
+        socketio.emit("ledger", {"game": game, "delta": delta, "net": net,
+                                 "rank": rank, "players": board_size}, to=sid)
+
+
+@app.route("/leaderboard")
+def leaderboard():
+    game = request.args.get("game", "deathroll")
+    if game not in LEDGER_GAMES:
+        return jsonify({"error": f"game must be one of {', '.join(LEDGER_GAMES)}"}), 400
+    k = max(1, min(request.args.get("k", 10, type=int), 100))
+    top, players = ledger.top(game, k)
+    result = {"game": game, "players": players, "top": top}
+
+    player = request.args.get("player")
+    if player:
+        standing = ledger.rank(player, game)
+        result["you"] = (
+            {"rank": standing[0], "net": ledger.net(player, game)} if standing else None
+        )
+    return jsonify(result)
 
 
 if __name__ == "__main__":
+    # register plugins on the main thread before serving, not behind the first request
+    plugins.wait()
     socketio.run(app, host="0.0.0.0", port=5000)
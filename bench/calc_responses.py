@@ -0,0 +1,86 @@
+"""
+Response size and time per calculation: full page vs fragment vs JSON.
+
+Posts the same form to every calculator route in each response mode through
+the Flask test client and reports bytes and mean milliseconds per request,
+then times the rendering step alone (template or jsonify) for each mode.
+
+    python -m bench.calc_responses [requests per case]
+"""
+import sys
+import time
+
+from flask import jsonify, render_template
+
+import app
+
+CASES = {
+    "/time": {"value": "90061", "unit": "second"},
+    "/month": {"start_date": "2024-01-31", "end_date": "2025-03-01", "start_time": "08:30"},
+    "/resolution": {"width": "1920", "height": "1080", "scales": "0.5,0.75,1,1.25,1.5"},
+    "/drives": {"drives": "8:160\n12:210\n16:320\n20:399"},
+    "/usable-space": {
+        "capacity_value": "8", "capacity_unit": "TB", "overhead_percent": "7", "reserved_gb": "20",
+    },
+    "/power-bill": {"wattage": "120", "provider": None},  # filled with the first provider
+    "/darkmoon": {"cards": "5", "deck": "Fables", "difficulty": "epic", "seed": "12345"},
+}
+
+MODES = {
+    "page": {},
+    "fragment": {"X-Fragment": "1"},
+    "json": {"Accept": "application/json"},
+}
+
+
+TEMPLATES = {
+    "/time": "time", "/month": "month", "/resolution": "resolution", "/drives": "drives",
+    "/usable-space": "usable_space", "/power-bill": "power_bill", "/darkmoon": "darkmoon",
+}
+
+
+def _per_call_ms(fn, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1000
+
+
+def render_times(client, n):
+    print(f"\n{'render only':<15}{'page':>10}{'fragment':>10}{'json':>10}")
+    for path, form in CASES.items():
+        context = client.post(path, data=form, headers=MODES["json"]).get_json()
+        name = TEMPLATES[path]
+        with app.app.test_request_context(path, method="POST"):
+            page = _per_call_ms(
+                lambda: render_template(f"{name}.html", providers=app.POWER_PROVIDERS, **context), n
+            )
+            fragment = _per_call_ms(lambda: render_template(f"{name}_result.html", **context), n)
+            as_json = _per_call_ms(lambda: jsonify(context), n)
+        print(f"{path:<15}{page:>8.3f}ms{fragment:>8.3f}ms{as_json:>8.3f}ms")
+
+
+def main(argv):
+    n = int(argv[1]) if len(argv) > 1 else 200
+    CASES["/power-bill"]["provider"] = app.POWER_PROVIDERS[0]["id"]
+    client = app.app.test_client()
+
+    print(f"{'route':<15}" + "".join(f"{mode:>18}" for mode in MODES))
+    for path, form in CASES.items():
+        row = f"{path:<15}"
+        for headers in MODES.values():
+            response = client.post(path, data=form, headers=headers)
+            assert response.status_code == 200, (path, response.status_code)
+            started = time.perf_counter()
+            for _ in range(n):
+                client.post(path, data=form, headers=headers)
+            ms = (time.perf_counter() - started) / n * 1000
+            row += f"{len(response.data):>8} B {ms:>6.2f}ms"
+        print(row)
+
+    render_times(client, n)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
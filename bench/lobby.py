@@ -0,0 +1,80 @@
+"""
+Lobby fan-out per tick: dirty-set diffs against rebroadcasting the full list.
+
+Builds a lobby of open blackjack tables (entries shaped like the app's), then
+for a range of changes per tick, marks that many tables and times one
+flush(). The "full" column is what a naive lobby would do on every tick:
+build every entry and encode the whole list. Bytes are the encoded payload;
+Socket.IO encodes a room broadcast once, then sends those bytes to every
+subscriber, so fan-out is bytes x subscribers.
+
+    python -m bench.lobby [tables] [subscribers]
+"""
+import json
+import random
+import sys
+import time
+
+from games.lobby import Lobby
+
+
+class _Recorder:
+    """Stands in for the SocketIO object: records what flush() broadcasts."""
+
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, payload, to=None):
+        self.sent.append(json.dumps(payload, separators=(",", ":")))
+
+    def start_background_task(self, target):
+        return object()     # ticks are driven by hand
+
+
+def main(argv):
+    tables = int(argv[1]) if len(argv) > 1 else 5000
+    subscribers = int(argv[2]) if len(argv) > 2 else 1000
+    rooms = {
+        f"bj-{i:05d}": {"seats": 2, "bet": None, "hand": 0} for i in range(tables)
+    }
+
+    def entry(room):
+        t = rooms.get(room)
+        if t is None:
+            return None
+        return {"room": room, "game": "blackjack", "seats": t["seats"], "max_seats": 7,
+                "bet": t["bet"], "hand": t["hand"], "of": 5}
+
+    recorder = _Recorder()
+    lobby = Lobby(recorder, entry)
+    # subscribe() needs a live Socket.IO session; one recorded sid is enough to make flush() emit
+    lobby._subscribers.add("bench")
+    for room in rooms:
+        lobby.mark(room)
+    lobby.flush()
+
+    started = time.perf_counter()
+    full = json.dumps({"set": [entry(r) for r in rooms], "removed": []}, separators=(",", ":"))
+    full_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{tables} open tables, {subscribers} subscribers")
+    print(f"  {'changes/tick':>12}{'flush ms':>10}{'bytes':>10}{'fan-out KB':>12}"
+          f"{'full ms':>10}{'full KB':>10}{'full fan-out MB':>17}")
+    rng = random.Random(1)
+    for changes in (1, 10, 100, 1000):
+        for room in rng.sample(sorted(rooms), changes):
+            rooms[room]["seats"] = rng.randint(2, 6)
+            rooms[room]["bet"] = rng.choice([None, 10, 50, 100])
+            lobby.mark(room)
+        recorder.sent.clear()
+        started = time.perf_counter()
+        lobby.flush()
+        flush_ms = (time.perf_counter() - started) * 1000
+        sent = sum(len(p) for p in recorder.sent)
+        print(f"  {changes:>12}{flush_ms:>10.2f}{sent:>10}{sent * subscribers / 1024:>12.0f}"
+              f"{full_ms:>10.2f}{len(full) / 1024:>10.0f}{len(full) * subscribers / 2**20:>17.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,140 @@
+"""
+In-match latency under a chat and queue flood, with and without admission control.
+
+Spammer threads pair up into deathroll rooms, then flood chat, queue joins
+and room listings on a fixed schedule: together they offer spam_rate events
+per second. A burst that falls behind schedule is skipped rather than made
+up, so both modes are offered the same load. Otherwise a rejected event
+returns sooner than a handled one, and the spammers would send more with
+admission on. Meanwhile a few measured rooms play rolls at a steady pace.
+The run reports the p50/p99 handler latency of those rolls and what admission
+control admitted, rate-limited or shed. Each mode runs in a fresh interpreter.
+
+    python -m bench.overload [seconds] [spammers] [spam_rate]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# each player rolls every other tick, well inside the game-class rate limit
+ROLL_EVERY = 0.1
+# events per second offered by all spammers together, 3 events per burst
+SPAM_RATE = 2000
+
+
+def _percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000 if samples else None
+
+
+def child(seconds, spammers, spam_rate):
+    os.environ["MATCH_LOG_PATH"] = os.path.join(tempfile.mkdtemp(), "events.bin")
+    os.environ["LEDGER_PATH"] = os.path.join(tempfile.mkdtemp(), "ledger.sqlite3")
+    import app
+
+    stop = threading.Event()
+    pairing = threading.Lock()
+    sent = []
+
+    def pair():
+        # queue both clients back to back so they land in the same room
+        a = app.socketio.test_client(app.app)
+        b = app.socketio.test_client(app.app)
+        with pairing:
+            a.emit("queue")
+            b.emit("queue")
+        sid = app.socketio.server.manager.sid_from_eio_sid(a.eio_sid, "/")
+        return a, b, app.pvp_rooms.get(app.sid_to_room.get(sid))
+
+    def spam():
+        client, _, _ = pair()
+        every = 3 * spammers / spam_rate
+        count = 0
+        due = time.monotonic()
+        while not stop.is_set():
+            client.emit("chat", "spam " * 40)
+            client.emit("bj_queue")
+            client.emit("spectate_list")
+            client.queue.clear()
+            count += 3
+            due += every
+            late = time.monotonic() - due
+            if late > 0:
+                due += every * (late // every + 1)     # skip the bursts we missed
+            time.sleep(max(0.0, due - time.monotonic()))
+        sent.append(count)
+
+    def player_pair(latencies):
+        while not stop.is_set():
+            a, b, game = pair()
+            if game is None:
+                a.disconnect()
+                b.disconnect()
+                continue
+            a.emit("bet", 10)
+            b.emit("bet", 10)
+            turn = 0
+            while not stop.is_set() and not game["finished"]:
+                client = (a, b)[turn % 2]
+                started = time.perf_counter()
+                client.emit("roll", game["max"])
+                latencies.append(time.perf_counter() - started)
+                turn += 1
+                time.sleep(ROLL_EVERY)
+            a.disconnect()
+            b.disconnect()
+
+    threads = [threading.Thread(target=spam, daemon=True) for _ in range(spammers)]
+    latencies = []
+    players = [threading.Thread(target=player_pair, args=(latencies,), daemon=True) for _ in range(4)]
+    for t in threads + players:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads + players:
+        t.join(timeout=10)
+
+    print(json.dumps({
+        "rolls": len(latencies),
+        "p50_ms": _percentile(latencies, 0.5),
+        "p99_ms": _percentile(latencies, 0.99),
+        "spam_per_s": sum(sent) / seconds,
+        "spam_offered": spam_rate,
+        "admission": app.admission.stats() if app.admission.enabled else None,
+    }))
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 10
+    spammers = int(argv[2]) if len(argv) > 2 else 32
+    spam_rate = float(argv[3]) if len(argv) > 3 else SPAM_RATE
+
+    for enabled in ("0", "1"):
+        env = dict(os.environ, ADMISSION_CONTROL=enabled)
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.overload", "--child", str(seconds), str(spammers),
+             str(spam_rate)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        label = "admission on" if enabled == "1" else "admission off"
+        print(f"{label}: {result['rolls']} rolls, p50 {result['p50_ms']:.2f}ms, "
+              f"p99 {result['p99_ms']:.2f}ms, {result['spam_per_s']:,.0f} of "
+              f"{result['spam_offered']:,.0f} spam events/s sent")
+        if result["admission"]:
+            print(f"  lag {result['admission']['lag_ms']:.1f}ms")
+            for cls, stats in result["admission"]["classes"].items():
+                print(f"  {cls:<6} admitted {stats['admitted']:>8} rate-limited {stats['rate']:>8} "
+                      f"shed {stats['shed']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(float(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4]))
+    else:
+        sys.exit(main(sys.argv))
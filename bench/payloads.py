@@ -0,0 +1,76 @@
+"""
+Bytes and encode time per emit for the hot PvP events, for every wire format.
+
+Payloads are built the way the handlers build them (a full seven-seat table
+for blackjack), then encoded with the same packet classes the Socket.IO server
+uses for JSON and for msgpack, with and without the compact schemas.
+
+    python -m bench.payloads [emits per case]
+"""
+import sys
+import timeit
+
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+from games import wire
+from games.deathroll_odds import odds
+
+ROLES = [f"P{i}" for i in range(1, 8)]
+
+
+def sample_payloads():
+    seats = [
+        {"role": role, "cards": ["10♠", "7♥", "A♦"][: 2 + i % 2], "v": 17 + i % 5, "done": i < 3}
+        for i, role in enumerate(ROLES)
+    ]
+    return {
+        "bj_state": {
+            "active": "P4", "seats": seats, "bet": 50, "in_round": True,
+            "hand": 3, "of": 5, "shoe": 241, "note": None,
+        },
+        "bj_result": {
+            "winner": "P2", "winners": ["P2"], "bet": 50,
+            "values": {r: 17 + i % 5 for i, r in enumerate(ROLES)},
+            "payouts": {r: (300 if r == "P2" else -50) for r in ROLES},
+            "series": {r: i % 3 for i, r in enumerate(ROLES)},
+            "hand": 3, "series_over": False,
+            "reason": "P2 wins with 21. Hand 3 of 5 done. Click Deal for the next hand.",
+            "seed": None,
+        },
+        "result": {"winner": "PlayerA", "loser": "PlayerB", "bet": 250, "seed": 4503599627370495},
+        "odds": odds(347),
+        "chat": "PlayerA rolled 347 (1–1000)",
+    }
+
+
+def encode(packet_class, event, payload):
+    return packet_class(packet.EVENT, data=[event, payload], namespace="/").encode()
+
+
+def main(argv):
+    emits = int(argv[1]) if len(argv) > 1 else 20_000
+    cases = [
+        ("json", packet.Packet, False),
+        ("json+compact", packet.Packet, True),
+        ("msgpack", MsgPackPacket, False),
+        ("msgpack+compact", MsgPackPacket, True),
+    ]
+
+    print(f"{'event':<10} {'format':<16} {'bytes':>6} {'us/emit':>8}")
+    for event, payload in sample_payloads().items():
+        for name, packet_class, compact in cases:
+            data = wire.compact(event, payload) if compact else payload
+            size = len(encode(packet_class, event, data))
+            # compaction runs on every emit, so it is part of the encode cost
+            if compact:
+                stmt = lambda: encode(packet_class, event, wire.compact(event, payload))  # noqa: E731
+            else:
+                stmt = lambda: encode(packet_class, event, payload)  # noqa: E731
+            seconds = timeit.timeit(stmt, number=emits)
+            print(f"{event:<10} {name:<16} {size:>6} {seconds / emits * 1e6:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,97 @@
+"""
+Cold-start and first-request latency, per plugin.
+
+Each run is a fresh interpreter, so every import is cold. It reports:
+
+    import     time for `import app` to return (server could start listening)
+    ready      time until every plugin finished loading
+    first      latency of the first request to "/" (includes any plugin wait)
+    per plugin import / setup time and the latency of its first probe request
+
+Runs are repeated with background loading (default) and PLUGINS_EAGER=1.
+
+    python -m bench.startup [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def child():
+    started = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+
+    client = app.app.test_client()
+    t = time.perf_counter()
+    client.get("/")
+    first = time.perf_counter() - t
+
+    app.plugins.wait()
+    stats = app.plugins.stats()
+    for plugin in stats["plugins"]:
+        t = time.perf_counter()
+        if plugin["probe"]:
+            client.get(plugin["probe"])
+        else:
+            app.socketio.test_client(app.app).disconnect()
+        plugin["first_ms"] = (time.perf_counter() - t) * 1000
+
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "ready_ms": stats["load_ms"],
+        "first_ms": first * 1000,
+        "plugins": stats["plugins"],
+    }))
+
+
+def run(eager):
+    env = dict(os.environ)
+    env.pop("PLUGINS_EAGER", None)
+    if eager:
+        env["PLUGINS_EAGER"] = "1"
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+
+def _ms(value):
+    return f"{value:8.1f}" if value is not None else "       -"
+
+
+def main(argv):
+    runs = int(argv[1]) if len(argv) > 1 else 5
+
+    for eager in (False, True):
+        results = [run(eager) for _ in range(runs)]
+        label = "eager" if eager else "background"
+        print(f"{label} loading, median of {runs} cold starts (ms)")
+        for key in ("import_ms", "ready_ms", "first_ms"):
+            print(f"  {key[:-3]:<14}{_ms(_median(r[key] for r in results))}")
+
+        print(f"  {'plugin':<14}{'import':>8}{'setup':>8}{'first':>8}  status")
+        for i, plugin in enumerate(results[0]["plugins"]):
+            column = [r["plugins"][i] for r in results]
+            print(f"  {plugin['name']:<14}"
+                  f"{_ms(_median(p['import_ms'] for p in column))}"
+                  f"{_ms(_median(p['setup_ms'] for p in column))}"
+                  f"{_ms(_median(p['first_ms'] for p in column))}  "
+                  f"{plugin['status']}{' (' + plugin['error'] + ')' if plugin['error'] else ''}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        sys.exit(main(sys.argv))
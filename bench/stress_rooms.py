@@ -0,0 +1,317 @@
+"""
+Concurrency stress run for the PvP socket handlers.
+
+Every simulated player is its own thread driving a Socket.IO test client, so
+both seats of a room race each other inside the handlers while hundreds of
+other rooms do the same. Afterwards it checks:
+
+    - no handler raised
+    - every deathroll room ended with exactly one result, seen by both players
+    - every blackjack hand paid out zero-sum and was reported once per seat
+    - every player who connected with a ledger id was settled what the
+      results paid them, including matches and hands forfeited by leaving
+    - the match log replays cleanly
+
+Every other player connects with a ledger id, so tables mix tracked and
+anonymous seats. Every LEAVE_EVERY-th player walks out mid-game: deathroll
+players once both bets are locked, blackjack players right after their
+first deal.
+
+Run from the repo root:
+
+    python -m bench.stress_rooms [rooms] [rooms per wave]
+
+COMPACT_PAYLOADS=1 runs it with the short-key schemas. The test client only
+decodes JSON packets, so SOCKETIO_SERIALIZER=msgpack is measured by
+bench/payloads.py instead.
+"""
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+
+RUN_DIR = tempfile.mkdtemp(prefix="stress-rooms-")
+LOG_PATH = os.path.join(RUN_DIR, "match_events.bin")
+os.environ["MATCH_LOG_PATH"] = LOG_PATH
+os.environ["LEDGER_PATH"] = os.path.join(RUN_DIR, "ledger.sqlite3")
+# the bots fire as fast as they can on purpose; rate limits would only slow the run
+os.environ["ADMISSION_CONTROL"] = "0"
+
+import app  # noqa: E402  (the log path has to be set before the app is imported)
+from games import eventlog, wire  # noqa: E402
+
+PLAYER_TIMEOUT = 60
+LEAVE_EVERY = 8
+_player_ids = itertools.count()
+
+
+class Player(threading.Thread):
+    game = None             # ledger game name
+    result_event = None
+
+    def __init__(self, wave, index):
+        super().__init__(daemon=True)
+        self.wave = wave
+        self.player = f"stress-{next(_player_ids):08d}" if index % 2 else None
+        self.leaver = index % LEAVE_EVERY == LEAVE_EVERY - 1
+        auth = {"player": self.player} if self.player else None
+        self.client = app.socketio.test_client(app.app, auth=auth)
+        self.sid = app.socketio.server.manager.sid_from_eio_sid(self.client.eio_sid, "/")
+        self.role = None
+        self.room = None
+        self.results = []
+        self.late = []          # results that reached the player while it was leaving
+        self.errors = []
+        self.emits = 0
+        self._seen = 0
+
+    def drain(self):
+        # the queue only grows while we run, so a cursor never loses a packet
+        # appended by another thread (get_received() swaps the list and can)
+        packets = self.client.queue[self._seen:]
+        self._seen += len(packets)
+        return [(p["name"], wire.expand(p["name"], p["args"][0]) if p["args"] else None)
+                for p in packets]
+
+    def send(self, event, *args):
+        self.emits += 1
+        try:
+            self.client.emit(event, *args)
+        except Exception as exc:  # a handler raised
+            self.errors.append(f"{event}: {exc!r}")
+
+    def run(self):
+        try:
+            self.play()
+        except Exception as exc:
+            self.errors.append(repr(exc))
+        finally:
+            self.client.disconnect()
+            self.late = [data for name, data in self.drain() if name == self.result_event]
+
+    def idle(self):
+        time.sleep(0.001)
+
+    def settled(self, hand_results):
+        """
+        What the ledger should hold for this player, from the results its
+        table was sent; None when nobody still seated saw the outcome.
+        """
+        raise NotImplementedError
+
+
+class DeathrollPlayer(Player):
+    game = "deathroll"
+    result_event = "result"
+
+    def settled(self, hand_results):
+        result = hand_results.get((self.room, None))
+        if result is None:
+            return None if self.leaver else 0
+        return result["bet"] if result["winner"] == self.role else -result["bet"]
+
+    def locked(self):
+        game = app.pvp_rooms.get(self.room)
+        return game is not None and len(game["bet"]) == 2
+
+    def play(self):
+        self.send("queue")
+        deadline = time.monotonic() + PLAYER_TIMEOUT
+        max_roll, bet_sent = None, False
+        while time.monotonic() < deadline:
+            for name, data in self.drain():
+                if name == "role":
+                    self.role = data
+                    self.room = app.sid_to_room.get(self.sid)
+                elif name == "odds":
+                    max_roll = data["max"]
+                elif name == "result":
+                    self.results.append(data)
+            if self.results:
+                return
+            if self.role and not bet_sent:
+                self.send("bet", 10)
+                bet_sent = True
+            if self.leaver and self.locked():
+                return  # run() disconnects with the bets locked
+            # both players fire at once; the room lock decides whose roll counts
+            if max_roll:
+                self.send("roll", max_roll)
+            self.idle()
+        self.errors.append("deathroll match timed out")
+
+
+class BlackjackPlayer(Player):
+    game = "blackjack"
+    result_event = "bj_result"
+
+    def __init__(self, wave, index):
+        super().__init__(wave, index)
+        self.left_hand = None   # hand number the player walked out of
+
+    def settled(self, hand_results):
+        mine = {r["hand"]: r for r in self.results + self.late}
+        if self.left_hand is not None and self.left_hand not in mine:
+            # the forfeit is only reported to the players still seated
+            forfeit = hand_results.get((self.room, self.left_hand))
+            if forfeit is None:
+                return None
+            mine[self.left_hand] = forfeit
+        return sum(r["payouts"].get(self.role, 0) for r in mine.values())
+
+    def alone(self):
+        # the others walked out; nobody is left to lock a bet with
+        game = app.bj_rooms.get(self.room)
+        return game is None or len(app._bj_seated(game)) < 2
+
+    def play(self):
+        self.send("bj_queue")
+        deadline = time.monotonic() + PLAYER_TIMEOUT
+        state = None
+        while time.monotonic() < deadline:
+            for name, data in self.drain():
+                if name == "bj_role":
+                    self.role = data
+                    self.room = app.bj_sid_to_room.get(self.sid)
+                    self.send("bj_bet", 10)
+                elif name == "bj_state":
+                    state = data
+                elif name == "bj_result":
+                    self.results.append(data)
+                    state = None
+            if self.results and self.results[-1]["series_over"]:
+                return
+            if (self.leaver and state and state["in_round"]
+                    and any(s["role"] == self.role for s in state["seats"])):
+                self.left_hand = state["hand"]
+                return  # run() disconnects with the hand still in play
+            if self.role is None:
+                if self.wave.is_set():
+                    return  # odd one out, nobody left to play with
+            elif state is None or not state["in_round"]:
+                if self.alone():
+                    # the seat is freed after the forfeit result is sent, so it's queued by now
+                    self.results.extend(d for name, d in self.drain() if name == "bj_result")
+                    return
+                self.send("bj_deal")
+            elif state["active"] == self.role:
+                mine = next(s for s in state["seats"] if s["role"] == self.role)
+                self.send("bj_hit" if mine["v"] < 17 else "bj_stand")
+                state = None
+            self.idle()
+        self.errors.append("blackjack series timed out")
+
+
+def run_wave(kind, players):
+    wave = threading.Event()
+    threads = [kind(wave, i) for i in range(players)]
+    for t in threads:
+        t.start()
+    # a blackjack straggler can be left queued once everyone else is seated
+    while any(t.is_alive() for t in threads):
+        waiting = [t for t in threads if t.is_alive()]
+        if len(waiting) <= 1 and all(t.role is None for t in waiting):
+            wave.set()
+        time.sleep(0.05)
+    return threads
+
+
+def check_deathroll(threads):
+    problems = []
+    winners = {}    # room -> winners its players were told
+    for t in threads:
+        seen = t.results + t.late
+        # a leaver only hears the result if the match ended before it got out
+        if t.role and (len(seen) > 1 or (not t.leaver and len(seen) != 1)):
+            problems.append(f"deathroll player got {len(seen)} results")
+        for r in seen:
+            winners.setdefault(t.room, set()).add(r["winner"])
+    for room, names in winners.items():
+        if len(names) != 1:
+            problems.append(f"deathroll {room} reported different winners: {sorted(names)}")
+    return problems
+
+
+def check_blackjack(threads):
+    problems = []
+    hands = 0
+    for t in threads:
+        numbers = [r["hand"] for r in t.results]
+        if numbers != sorted(set(numbers)):
+            problems.append(f"blackjack hands reported out of order or twice: {numbers}")
+        for r in t.results:
+            if sum(r["payouts"].values()) != 0:
+                problems.append(f"hand {r['hand']} payouts are not zero-sum: {r['payouts']}")
+        hands += len(t.results)
+    return problems, hands
+
+
+def check_ledger(threads):
+    # ledger.record() runs inline in the handler, so the in-memory nets are final here
+    hand_results = {}   # (room, hand) -> the result every seat at that table was sent
+    for t in threads:
+        for r in t.results + t.late:
+            if t.room:
+                hand_results[(t.room, r.get("hand"))] = r
+    problems = []
+    for t in threads:
+        if not t.player or t.role is None:
+            continue
+        expected, net = t.settled(hand_results), app.ledger.net(t.player, t.game)
+        if expected is not None and net != expected:
+            problems.append(f"{t.game} ledger for {t.role} is {net}, results paid {expected}")
+    return problems
+
+
+def main(argv):
+    rooms = int(argv[1]) if len(argv) > 1 else 2000
+    per_wave = int(argv[2]) if len(argv) > 2 else 200
+
+    problems = []
+    emits = 0
+    started = time.perf_counter()
+
+    for kind in (DeathrollPlayer, BlackjackPlayer):
+        name = kind.__name__
+        done = 0
+        seen_hands = 0
+        for offset in range(0, rooms, per_wave):
+            threads = run_wave(kind, 2 * min(per_wave, rooms - offset))
+            for t in threads:
+                problems.extend(t.errors)
+                emits += t.emits
+            if kind is DeathrollPlayer:
+                problems.extend(check_deathroll(threads))
+            else:
+                found, hands = check_blackjack(threads)
+                problems.extend(found)
+                seen_hands += hands
+            problems.extend(check_ledger(threads))
+            done += len(threads)
+        print(f"{name}: {done} players" + (f", {seen_hands} seat-hands" if seen_hands else ""))
+
+    elapsed = time.perf_counter() - started
+    app.lobby.flush()
+    shared = (app.pvp_queue, app.pvp_rooms, app.sid_to_room,
+              app.bj_queue, app.bj_rooms, app.bj_sid_to_room, app.bj_open_rooms,
+              app.lobby.entries())
+    for leftover in shared:
+        if leftover:
+            problems.append(f"{len(leftover)} entries left behind after every player disconnected")
+
+    app.match_log.close()
+    summary, replay_problems = eventlog.replay(LOG_PATH)
+    problems.extend(f"match {m}: {p}" for m, p in replay_problems)
+
+    print(f"{emits} events in {elapsed:.1f}s ({emits / elapsed:,.0f}/s), "
+          f"{summary['matches']} matches logged")
+    for problem in problems[:50]:
+        print(problem)
+    print("OK" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,99 @@
+"""
+First-request latency of every page, with and without compiled templates.
+
+Each run is a fresh interpreter, like a new worker after a deploy:
+
+    none        no bytecode cache, no warm-up (compile on first hit)
+    cold cache  bytecode cache in an empty directory (the first worker)
+    warm cache  the directory the cold run filled (every later worker)
+    warm-up     warm cache plus warm-up at boot
+
+For each it reports the time until plugins (and warm-up) finished, the
+first request to each page, and the same page again at steady state.
+
+    python -m bench.templates [runs]
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = [
+    "/", "/time", "/month", "/resolution", "/drives", "/usable-space", "/power-bill",
+    "/darkmoon", "/deathroll", "/deathroll-pvp", "/blackjack", "/blackjack-pvp",
+]
+
+
+def child():
+    import app
+
+    app.plugins.wait()
+    client = app.app.test_client()
+    first, steady = {}, {}
+    for page in PAGES:
+        for timings in (first, steady):
+            t = time.perf_counter()
+            client.get(page)
+            timings[page] = (time.perf_counter() - t) * 1000
+
+    print(json.dumps({"ready_ms": app.plugins.stats()["load_ms"], "first": first, "steady": steady}))
+
+
+def run(cache_dir, warmup):
+    env = dict(os.environ, TEMPLATE_WARMUP="1" if warmup else "0")
+    if cache_dir:
+        env.update(TEMPLATE_CACHE="1", TEMPLATE_CACHE_DIR=cache_dir)
+    else:
+        env["TEMPLATE_CACHE"] = "0"
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.templates", "--child"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv):
+    runs = int(argv[1]) if len(argv) > 1 else 5
+    modes = {"none": [], "cold cache": [], "warm cache": [], "warm-up": []}
+
+    for _ in range(runs):
+        cache_dir = tempfile.mkdtemp(prefix="jinja-bench-")
+        try:
+            modes["none"].append(run(None, False))
+            modes["cold cache"].append(run(cache_dir, False))
+            modes["warm cache"].append(run(cache_dir, False))
+            modes["warm-up"].append(run(cache_dir, True))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"median of {runs} fresh workers (ms)")
+    print(f"  {'mode':<12}{'ready':>8}{'first all':>11}{'first max':>11}{'steady all':>12}")
+    for mode, results in modes.items():
+        print(f"  {mode:<12}"
+              f"{_median(r['ready_ms'] for r in results):8.1f}"
+              f"{_median(sum(r['first'].values()) for r in results):11.1f}"
+              f"{_median(max(r['first'].values()) for r in results):11.1f}"
+              f"{_median(sum(r['steady'].values()) for r in results):12.1f}")
+
+    print()
+    print(f"  {'first hit per page':<20}" + "".join(f"{mode:>12}" for mode in modes))
+    for page in PAGES:
+        print(f"  {page:<20}" + "".join(
+            f"{_median(r['first'][page] for r in results):12.2f}" for results in modes.values()
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        sys.exit(main(sys.argv))
@@ -0,0 +1,240 @@
+"""
+Hit/stand expected values for PvP blackjack.
+
+Outcomes follow bj_finish: the higher non-bust total wins the bet, ties and
+double busts push. A hand is (total, soft) where soft means an ace is still
+counted as 11. The opponent's visible total is treated as final, and cards
+come from the remaining shoe, tracked as counts per rank:
+
+    A, 2, 3, 4, 5, 6, 7, 8, 9, ten-valued
+
+Run `python -m games.bj_strategy [hands]` to score simulated hands in bulk.
+"""
+import sys
+import time
+from functools import lru_cache
+
+RANK_INDEX = {"A": 0, "J": 9, "Q": 9, "K": 9, "10": 9}
+RANK_INDEX.update({str(n): n - 1 for n in range(2, 10)})
+RANK_VALUES = (11, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+
+FRESH_DECK = (4, 4, 4, 4, 4, 4, 4, 4, 4, 16)
+
+# opponent totals above 21 are all the same bust
+BUST = 22
+
+
+def rank_index(rank):
+    return RANK_INDEX[rank]
+
+
+def hand_state(ranks):
+    """ranks: list of rank strings -> (total, soft)"""
+    total, soft_aces = 0, 0
+    for rank in ranks:
+        total, soft_aces = _add(total, soft_aces, RANK_INDEX[rank])
+    return total, soft_aces > 0
+
+
+def _add(total, soft_aces, idx):
+    total += RANK_VALUES[idx]
+    soft_aces += idx == 0
+    while total > 21 and soft_aces:
+        total -= 10
+        soft_aces -= 1
+    return total, soft_aces
+
+
+def stand_ev(total, opp):
+    if total > 21:
+        return 0.0 if opp > 21 else -1.0
+    if opp > 21 or total > opp:
+        return 1.0
+    return 0.0 if total == opp else -1.0
+
+
+@lru_cache(maxsize=200_000)
+def _best(total, soft, opp, shoe):
+    """(best EV, hit EV) for a live hand facing a final opponent total."""
+    stand = stand_ev(total, opp)
+    remaining = sum(shoe)
+    if total >= 21 or remaining == 0:
+        return stand, float("-inf")
+
+    hit = 0.0
+    for idx, count in enumerate(shoe):
+        if not count:
+            continue
+        new_total, soft_aces = _add(total, int(soft), idx)
+        if new_total > 21:
+            value = stand_ev(new_total, opp)
+        else:
+            rest = shoe[:idx] + (count - 1,) + shoe[idx + 1:]
+            value = _best(new_total, soft_aces > 0, opp, rest)[0]
+        hit += count / remaining * value
+    return max(stand, hit), hit
+
+
+def evaluate(total, soft, opp, shoe=FRESH_DECK):
+    """
+    total, soft: the player's hand
+    opp: opponent total (anything over 21 is a bust)
+    shoe: remaining card counts per rank
+    returns: dict with stand/hit EVs and the better action
+    """
+    opp = min(opp, BUST)
+    stand = stand_ev(total, opp)
+    hit = _best(total, bool(soft), opp, tuple(shoe))[1] if total < 21 else float("-inf")
+    return {
+        "stand": stand,
+        "hit": None if hit == float("-inf") else hit,
+        "action": "hit" if hit > stand else "stand",
+    }
+
+
+# ---------------- Fresh-deck table ----------------
+
+_fresh_table = None
+
+
+def fresh_table():
+    """
+    {(total, soft, opp): (stand EV, hit EV)} for a full 52-card deck,
+    built on first use.
+    """
+    global _fresh_table
+    if _fresh_table is None:
+        table = {}
+        for opp in range(2, BUST + 1):
+            for total in range(4, 22):
+                for soft in (False, True):
+                    if soft and total < 12:
+                        continue
+                    ev = evaluate(total, soft, opp)
+                    table[(total, soft, opp)] = (ev["stand"], ev["hit"])
+        _fresh_table = table
+    return _fresh_table
+
+
+def advise(hand_ranks, opp_ranks, shoe=None):
+    """
+    hand_ranks, opp_ranks: rank strings ("A", "7", "K", ...)
+    shoe: remaining counts per rank, or None for a fresh deck minus the visible cards
+    """
+    total, soft = hand_state(hand_ranks)
+    opp, _ = hand_state(opp_ranks)
+
+    if shoe is None:
+        counts = list(FRESH_DECK)
+        for rank in list(hand_ranks) + list(opp_ranks):
+            idx = RANK_INDEX[rank]
+            if counts[idx] == 0:
+                raise ValueError("more cards than one deck holds")
+            counts[idx] -= 1
+        shoe = counts
+
+    result = evaluate(total, soft, opp, shoe)
+    result.update({"total": total, "soft": soft, "opp": opp})
+    return result
+
+
+def shoe_counts(cards):
+    """cards: list of card dicts (with "r") -> counts per rank"""
+    counts = [0] * 10
+    for card in cards:
+        counts[RANK_INDEX[card["r"]]] += 1
+    return counts
+
+
+# ---------------- Bulk evaluator ----------------
+
+def _policy_array():
+    import numpy as np
+
+    # hit[total, soft, opp] from the fresh-deck table
+    policy = np.zeros((32, 2, BUST + 1), dtype=bool)
+    for (total, soft, opp), (stand, hit) in fresh_table().items():
+        policy[total, int(soft), opp] = hit is not None and hit > stand
+    return policy
+
+
+def score_hands(p1_totals, p2_totals):
+    """Vectorized bj_finish: +1 P1 wins, -1 P2 wins, 0 push."""
+    import numpy as np
+
+    s1 = np.where(p1_totals > 21, 0, p1_totals)
+    s2 = np.where(p2_totals > 21, 0, p2_totals)
+    return np.sign(s1 - s2).astype(np.int8)
+
+
+def _play(np, gen, policy, totals, soft_aces, opp):
+    probs = np.array(FRESH_DECK) / 52
+    values = np.array(RANK_VALUES)
+    active = policy[totals, np.minimum(soft_aces, 1), np.minimum(opp, BUST)]
+    while active.any():
+        idx = np.flatnonzero(active)
+        drawn = gen.choice(10, size=idx.size, p=probs)
+        t = totals[idx] + values[drawn]
+        s = soft_aces[idx] + (drawn == 0)
+        reduce = (t > 21) & (s > 0)
+        t -= 10 * reduce
+        s -= reduce
+        totals[idx], soft_aces[idx] = t, s
+        still = (t <= 21) & policy[np.minimum(t, 31), np.minimum(s, 1), np.minimum(opp[idx], BUST)]
+        active[:] = False
+        active[idx[still]] = True
+    return totals
+
+
+def simulate(n, seed=None):
+    """
+    Play n PvP hands with both seats following the fresh-deck table.
+    Cards are drawn with fresh-deck odds (an infinite shoe). P1 plays out
+    against P2's first two cards, then P2 plays against P1's final total.
+    returns: dict with P1's win/push/loss rates and mean result
+    """
+    import numpy as np
+
+    gen = np.random.default_rng(seed)
+    policy = _policy_array()
+    probs = np.array(FRESH_DECK) / 52
+    values = np.array(RANK_VALUES)
+
+    cards = gen.choice(10, size=(4, n), p=probs)
+    t1 = values[cards[0]] + values[cards[1]]
+    t2 = values[cards[2]] + values[cards[3]]
+    a1 = (cards[0] == 0).astype(np.int64) + (cards[1] == 0)
+    a2 = (cards[2] == 0).astype(np.int64) + (cards[3] == 0)
+    # two aces start as 12 with one soft ace
+    t1 -= 10 * (a1 == 2)
+    a1 -= a1 == 2
+    t2 -= 10 * (a2 == 2)
+    a2 -= a2 == 2
+
+    t1 = _play(np, gen, policy, t1, a1, t2.copy())
+    t2 = _play(np, gen, policy, t2, a2, t1.copy())
+
+    outcome = score_hands(t1, t2)
+    return {
+        "hands": n,
+        "p1_win": float((outcome > 0).mean()),
+        "push": float((outcome == 0).mean()),
+        "p1_loss": float((outcome < 0).mean()),
+        "p1_ev": float(outcome.mean()),
+    }
+
+
+def main(argv):
+    n = int(argv[1]) if len(argv) > 1 else 1_000_000
+    fresh_table()
+    started = time.perf_counter()
+    result = simulate(n)
+    elapsed = time.perf_counter() - started
+    for key, value in result.items():
+        print(f"{key:<8} {value}")
+    print(f"{n / elapsed:,.0f} hands/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,55 @@
+"""
+Exact deathroll odds.
+
+P(m) is the chance that the player about to /roll m eventually loses.
+Rolling 1 loses outright; rolling r >= 2 hands the opponent max r, so
+
+    P(m) = (1 + sum(1 - P(r) for r in 2..m)) / m
+
+P(m) appears on both sides through r = m; solving for it gives
+
+    P(m) = (2 + S(m - 1)) / (m + 1),    S(k) = sum(1 - P(r) for r in 2..k)
+
+so one running sum fills the table in O(n).
+"""
+import threading
+from array import array
+
+# the table never grows past this; P(m) has long converged by then
+LIMIT = 1_000_000
+MIN_GROWTH = 1024
+
+_table = array("d", [0.0, 1.0])  # index 0 unused, P(1) = 1
+_running_sum = 0.0               # S(len(_table) - 1)
+_lock = threading.Lock()
+
+
+def _grow(n):
+    global _running_sum
+    with _lock:
+        m = len(_table)
+        if n < m:
+            return
+        # grow geometrically so a slow climb of max values doesn't rebuild often
+        target = min(LIMIT, max(n, 2 * m, MIN_GROWTH))
+        total = _running_sum
+        for m in range(m, target + 1):
+            p = (2.0 + total) / (m + 1)
+            _table.append(p)
+            total += 1.0 - p
+        _running_sum = total
+
+
+def lose_chance(max_roll):
+    """Chance that the player about to roll 1..max_roll eventually loses."""
+    m = min(int(max_roll), LIMIT)
+    if m < 1:
+        raise ValueError("max roll must be at least 1")
+    if m >= len(_table):
+        _grow(m)
+    return _table[m]
+
+
+def odds(max_roll):
+    lose = lose_chance(max_roll)
+    return {"max": int(max_roll), "lose": lose, "win": 1.0 - lose}
@@ -0,0 +1,308 @@
+"""
+Append-only binary log of PvP game events.
+
+Every record is a fixed RECORD.size-byte struct:
+    ts (f64), match id (u64), kind (u8), seat (u8), a (i64), b (i64)
+
+What a and b hold depends on the kind:
+    QUEUE   a=game
+    START   a=seed, b=game
+    BET     a=amount
+    ROLL    a=roll, b=max
+    DEAL    a, b = the seat's two card codes
+    HIT     a=card code, b=new hand total
+    STAND   a=hand total
+    RESULT  a=currency delta for the seat, b=final hand total (blackjack)
+    LEAVE   the seat walked out of a deathroll with locked bets and loses it
+
+Run `python -m games.eventlog <path>` to re-simulate every match in a log.
+Deathroll rolls are redrawn from the START seed; blackjack shoes are
+reshuffled from it, and every dealt and hit card must come off that shoe.
+Like any replay of a RandomStream, this needs the same backend (numpy or not)
+as the server that wrote the log.
+"""
+import atexit
+import itertools
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+RECORD = struct.Struct("<dQBBqq")
+
+log = logging.getLogger(__name__)
+
+# event kinds
+QUEUE = 1
+START = 2
+BET = 3
+ROLL = 4
+DEAL = 5
+HIT = 6
+STAND = 7
+RESULT = 8
+LEAVE = 9
+
+KIND_NAMES = {
+    QUEUE: "queue", START: "start", BET: "bet", ROLL: "roll",
+    DEAL: "deal", HIT: "hit", STAND: "stand", RESULT: "result", LEAVE: "leave",
+}
+
+# games
+DEATHROLL = 1
+BLACKJACK = 2
+
+CARD_RANKS = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+CARD_SUITS = ("♠", "♥", "♦", "♣")
+
+# the blackjack shoe as app.py deals it; keep in step with BJ_SHOE_DECKS and BJ_PENETRATION
+SHOE_DECKS = 6
+SHOE_PENETRATION = 0.75
+# card codes of one deck in the order app.py lays it out before shuffling: suit by suit, A to K
+DECK_CODES = tuple(r * 4 + s for s in range(len(CARD_SUITS)) for r in range(len(CARD_RANKS)))
+
+
+def card_code(card):
+    return CARD_RANKS.index(card["r"]) * 4 + CARD_SUITS.index(card["s"])
+
+
+def card_value(code):
+    rank = CARD_RANKS[code // 4]
+    return 11 if rank == "A" else 10 if rank in ("J", "Q", "K") else int(rank)
+
+
+class EventLog:
+    """
+    Buffered, non-blocking writer for the match log.
+
+    append() only packs the record and puts it on a queue. A background
+    thread writes whatever has queued up and fsyncs once per batch, at most
+    every `flush_interval` seconds, so handlers never wait on the disk.
+    """
+
+    def __init__(self, path, flush_interval=0.25, max_batch=4096):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0        # records lost to write errors
+        # ids stay unique across restarts: start time in the high bits, counter below
+        self._ids = itertools.count((int(time.time()) << 20) + 1)
+
+    def new_match(self):
+        return next(self._ids)
+
+    def append(self, match, kind, seat=0, a=0, b=0):
+        self._queue.put(RECORD.pack(time.time(), match, kind, seat, a, b))
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="match-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.path, "ab")
+
+    def _run(self):
+        fh = None
+        running = True
+        while running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+
+            # group commit: collect everything that arrives within the window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    running = False
+                    break
+                batch.append(record)
+
+            # a failed write costs this batch only; the thread keeps draining the
+            # queue and reopens the file next time, so memory stays bounded
+            try:
+                if fh is None:
+                    fh = self._open()
+                fh.write(b"".join(batch))
+                fh.flush()
+                os.fsync(fh.fileno())
+            except Exception:
+                self.dropped += len(batch)
+                log.exception("match log: %d records not written to %s", len(batch), self.path)
+                if fh is not None:
+                    try:
+                        fh.close()
+                    except OSError:
+                        pass
+                    fh = None
+        if fh is not None:
+            fh.close()
+
+
+# ---------------- Reader / replayer ----------------
+
+def read_records(path, chunk_records=65536):
+    """Yield (ts, match, kind, seat, a, b) tuples from a log file."""
+    chunk_size = RECORD.size * chunk_records
+    with open(path, "rb") as fh:
+        while True:
+            data = fh.read(chunk_size)
+            if not data:
+                return
+            # a crash can leave a partial record at the end; ignore it
+            usable = len(data) - len(data) % RECORD.size
+            yield from RECORD.iter_unpack(data[:usable])
+            if usable < chunk_size:
+                return
+
+
+def _hand_total(codes):
+    total = sum(card_value(c) for c in codes)
+    aces = sum(1 for c in codes if c < 4)
+    while total > 21 and aces > 0:
+        total -= 10
+        aces -= 1
+    return total
+
+
+class _Replay:
+    """Re-simulation state for one match."""
+
+    def __init__(self, game, seed):
+        from games.rng import RandomStream
+
+        self.game = game
+        self.rng = RandomStream(seed)
+        self.hands = {}
+        self.loser = None
+        self.results = 0
+        # blackjack: the shoe rebuilt from the seed, dealt from the end like app.py
+        self.shoe = []
+        self.cut = 0
+        self.last_kind = None
+
+    def _new_shoe(self):
+        self.shoe = list(DECK_CODES) * SHOE_DECKS
+        self.rng.shuffle(self.shoe)
+        self.cut = int(len(self.shoe) * (1 - SHOE_PENETRATION))
+
+    def _draw(self):
+        return self.shoe.pop() if self.shoe else None
+
+    def feed(self, kind, seat, a, b):
+        """Apply one event, returns a problem description or None."""
+        problem = None
+        if kind == ROLL:
+            if self.rng.randint(1, b) != a:
+                problem = "roll does not match seed"
+            if a == 1:
+                self.loser = seat
+        elif kind == LEAVE:
+            self.loser = seat
+        elif kind == DEAL:
+            # a hand's DEAL records come together, in seat order; the cut card
+            # is checked once, before the first of them
+            if self.last_kind != DEAL and len(self.shoe) <= self.cut:
+                self._new_shoe()
+            if (self._draw(), self._draw()) != (a, b):
+                problem = f"seat {seat} deal does not match the shoe"
+            self.hands[seat] = [a, b]
+        elif kind == HIT:
+            if self._draw() != a:
+                problem = f"seat {seat} hit does not match the shoe"
+            self.hands.setdefault(seat, []).append(a)
+            if _hand_total(self.hands[seat]) != b:
+                problem = problem or f"seat {seat} hit total does not match its cards"
+        elif kind == RESULT:
+            self.results += 1
+            if self.game == DEATHROLL:
+                if a and (a < 0) != (seat == self.loser):
+                    problem = "result does not match rolls"
+            elif seat in self.hands and _hand_total(self.hands[seat]) != b:
+                problem = f"seat {seat} total does not match its cards"
+        self.last_kind = kind
+        return problem
+
+
+def replay(path):
+    """
+    Re-simulate every match in a log.
+    returns: (summary dict, list of (match id, problem))
+    """
+    matches = {}
+    counts = {name: 0 for name in KIND_NAMES.values()}
+    problems = []
+
+    for _, match_id, kind, seat, a, b in read_records(path):
+        name = KIND_NAMES.get(kind, "unknown")
+        counts[name] = counts.get(name, 0) + 1
+        if kind == QUEUE:
+            continue
+        if kind == START:
+            matches[match_id] = _Replay(b, a)
+            continue
+
+        match = matches.get(match_id)
+        if match is None:
+            continue
+        problem = match.feed(kind, seat, a, b)
+        if problem:
+            problems.append((match_id, problem))
+
+    summary = {
+        "events": counts,
+        "matches": len(matches),
+        "finished": sum(1 for m in matches.values() if m.results),
+    }
+    return summary, problems
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("usage: python -m games.eventlog <log path>")
+        return 2
+
+    started = time.perf_counter()
+    summary, problems = replay(argv[1])
+    elapsed = time.perf_counter() - started
+
+    total = sum(summary["events"].values())
+    print(f"{total} events, {summary['matches']} matches ({summary['finished']} finished) "
+          f"in {elapsed:.3f}s")
+    for name, count in summary["events"].items():
+        print(f"  {name:<7} {count}")
+    for match_id, problem in problems:
+        print(f"match {match_id}: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,215 @@
+"""
+Server-side ledger of PvP winnings, with a leaderboard per game.
+
+Every settled result is one entry (player, game, delta, match). The ledger
+keeps each player's net per game in memory, next to an OrderStatTree ordered
+by (-net, player), so top-k and a player's rank never touch the database.
+Writes go to SQLite in WAL mode from one background thread that commits
+whatever has queued in a single transaction, like EventLog does for the
+match log.
+"""
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from games.ranking import OrderStatTree
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    player TEXT NOT NULL,
+    game TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    match INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_player ON entries (player, game);
+CREATE TABLE IF NOT EXISTS standings (
+    player TEXT NOT NULL,
+    game TEXT NOT NULL,
+    net INTEGER NOT NULL,
+    PRIMARY KEY (player, game)
+);
+CREATE INDEX IF NOT EXISTS standings_net ON standings (game, net DESC);
+CREATE TABLE IF NOT EXISTS players (
+    player TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+"""
+
+
+def _connect(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL only syncs at checkpoints; a crash can lose the last batch, never corrupt
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+class Ledger:
+    def __init__(self, path, flush_interval=0.05, max_batch=1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._net = None        # (game, player) -> net, loaded on first use
+        self._boards = {}       # game -> OrderStatTree of (-net, player)
+        self._names = {}
+        self.dropped = 0        # queued writes lost to database errors
+
+    # ---------------- Reads ----------------
+
+    def _load(self):
+        db = _connect(self.path)
+        try:
+            self._net = {(g, p): n for p, g, n in db.execute("SELECT player, game, net FROM standings")}
+            self._names = dict(db.execute("SELECT player, name FROM players"))
+        finally:
+            db.close()
+        for (game, player), net in self._net.items():
+            self._board(game).insert((-net, player))
+
+        self._thread = threading.Thread(target=self._run, name="ledger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _ensure_loaded(self):
+        if self._net is None:
+            self._load()
+
+    def _board(self, game):
+        board = self._boards.get(game)
+        if board is None:
+            board = self._boards[game] = OrderStatTree()
+        return board
+
+    def net(self, player, game):
+        with self._lock:
+            self._ensure_loaded()
+            return self._net.get((game, player), 0)
+
+    def rank(self, player, game):
+        """-> (1-based rank, players on the board), or None if the player has no entries."""
+        with self._lock:
+            self._ensure_loaded()
+            net = self._net.get((game, player))
+            if net is None:
+                return None
+            board = self._board(game)
+            return board.rank((-net, player)) + 1, len(board)
+
+    def top(self, game, k=10):
+        with self._lock:
+            self._ensure_loaded()
+            board = self._board(game)
+            return [
+                {"rank": i + 1, "name": self._names.get(player, player[:8]), "net": -neg}
+                for i, (neg, player) in enumerate(board.first(k))
+            ], len(board)
+
+    def name(self, player):
+        with self._lock:
+            self._ensure_loaded()
+            return self._names.get(player)
+
+    # ---------------- Writes ----------------
+
+    def record(self, player, game, delta, match=0):
+        """Apply a settled result. Returns the player's new net for the game."""
+        with self._lock:
+            self._ensure_loaded()
+            key = (game, player)
+            board = self._board(game)
+            old = self._net.get(key)
+            if old is not None:
+                board.remove((-old, player))
+            net = (old or 0) + delta
+            self._net[key] = net
+            board.insert((-net, player))
+            # queued under the lock so the writer sees nets in the order they were made
+            self._queue.put(("entry", time.time(), player, game, delta, match, net))
+        return net
+
+    def set_name(self, player, name):
+        with self._lock:
+            self._ensure_loaded()
+            if self._names.get(player) == name:
+                return
+            self._names[player] = name
+            self._queue.put(("name", player, name))
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        db = None
+        running = True
+        while running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+
+            # group commit: one transaction for everything that arrives within the window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            # a failed batch is logged and skipped; the thread stays up to drain the queue
+            try:
+                if db is None:
+                    db = _connect(self.path)
+                self._write(db, batch)
+            except Exception:
+                self.dropped += len(batch)
+                log.exception("ledger: %d writes not saved to %s", len(batch), self.path)
+                if db is not None:
+                    db.close()
+                    db = None
+        if db is not None:
+            db.close()
+
+    def _write(self, db, batch):
+        entries = [item[1:6] for item in batch if item[0] == "entry"]
+        nets = {(item[2], item[3]): item[6] for item in batch if item[0] == "entry"}
+        names = {item[1]: item[2] for item in batch if item[0] == "name"}
+        with db:
+            db.executemany(
+                "INSERT INTO entries (ts, player, game, delta, match) VALUES (?, ?, ?, ?, ?)",
+                entries,
+            )
+            db.executemany(
+                "INSERT INTO standings (player, game, net) VALUES (?, ?, ?) "
+                "ON CONFLICT (player, game) DO UPDATE SET net = excluded.net",
+                [(p, g, n) for (p, g), n in nets.items()],
+            )
+            db.executemany(
+                "INSERT INTO players (player, name) VALUES (?, ?) "
+                "ON CONFLICT (player) DO UPDATE SET name = excluded.name",
+                list(names.items()),
+            )
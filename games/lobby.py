@@ -0,0 +1,89 @@
+import threading
+
+from flask_socketio import join_room, leave_room
+
+
+class Lobby:
+    """
+    Live list of open tables, sent as diffs on a fixed tick.
+
+    Handlers call mark(room) whenever something a lobby entry shows may have
+    changed (seats, bet, open or not). That is a set insert. A background
+    task wakes every `interval` seconds, rebuilds the entry of each marked
+    room only, compares it to what subscribers last saw, and broadcasts one
+    "lobby" diff to the lobby channel:
+
+        {"set": [entry, ...], "removed": [room, ...]}
+
+    so the cost of a tick follows the number of changes, not the number of
+    tables. A new subscriber gets the whole list once, from the entries
+    already kept here, flagged {"full": true}.
+    """
+
+    channel = "lobby"
+
+    def __init__(self, socketio, entry, interval=0.5):
+        self.socketio = socketio
+        self.entry = entry        # room -> dict, or None when the room isn't open
+        self.interval = interval
+        self._entries = {}        # room -> entry as subscribers last saw it
+        self._subscribers = set()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._task = None
+
+    def subscribe(self, sid):
+        # join before reading the entries: a diff sent in between is applied
+        # on top of a list that already has it, which is harmless
+        join_room(self.channel, sid=sid)
+        with self._lock:
+            self._subscribers.add(sid)
+        entries = self.entries()
+        self.socketio.emit("lobby", {"full": True, "set": entries, "removed": []}, to=sid)
+
+    def unsubscribe(self, sid, leave=True):
+        """leave=False when Socket.IO already dropped the sid (disconnect)."""
+        with self._lock:
+            if sid not in self._subscribers:
+                return
+            self._subscribers.discard(sid)
+        if leave:
+            leave_room(self.channel, sid=sid)
+
+    def mark(self, room):
+        # tracked even with nobody subscribed, so the next subscriber's list is current.
+        # _lock is a leaf: callers may hold room locks or matchmaking_lock here
+        with self._lock:
+            self._dirty.add(room)
+            if self._task is None:
+                self._task = self.socketio.start_background_task(self._run)
+
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+
+        changed, removed = [], []
+        for room in dirty:
+            entry = self.entry(room)
+            with self._lock:
+                if entry is None:
+                    if self._entries.pop(room, None) is not None:
+                        removed.append(room)
+                elif self._entries.get(room) != entry:
+                    self._entries[room] = entry
+                    changed.append(entry)
+
+        if (changed or removed) and self._subscribers:
+            self.socketio.emit("lobby", {"set": changed, "removed": removed}, to=self.channel)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            self.flush()
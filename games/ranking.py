@@ -0,0 +1,117 @@
+import random
+
+
+class _Node:
+    __slots__ = ("key", "prio", "size", "left", "right")
+
+    def __init__(self, key, prio):
+        self.key = key
+        self.prio = prio
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _fix(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+class OrderStatTree:
+    """
+    A sorted multiset of keys with subtree sizes (a treap).
+
+    insert, remove, rank and select take O(log n) expected time, and the
+    first k keys come out in O(log n + k). Not thread-safe; callers hold
+    their own lock.
+    """
+
+    def __init__(self, keys=()):
+        self._root = None
+        self._rand = random.Random()
+        for key in sorted(keys):
+            self.insert(key)
+
+    def __len__(self):
+        return _size(self._root)
+
+    def _split(self, node, key, inclusive):
+        """-> (keys before key, the rest); inclusive puts key itself on the left."""
+        if node is None:
+            return None, None
+        if node.key < key or (inclusive and node.key == key):
+            left, right = self._split(node.right, key, inclusive)
+            node.right = left
+            return _fix(node), right
+        left, right = self._split(node.left, key, inclusive)
+        node.left = right
+        return left, _fix(node)
+
+    def _merge(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        if a.prio > b.prio:
+            a.right = self._merge(a.right, b)
+            return _fix(a)
+        b.left = self._merge(a, b.left)
+        return _fix(b)
+
+    def insert(self, key):
+        left, right = self._split(self._root, key, False)
+        node = _Node(key, self._rand.random())
+        self._root = self._merge(self._merge(left, node), right)
+
+    def remove(self, key):
+        """Remove one copy of key; returns False if it wasn't there."""
+        left, rest = self._split(self._root, key, False)
+        equal, right = self._split(rest, key, True)
+        found = equal is not None
+        if found:
+            equal = self._merge(equal.left, equal.right)
+        self._root = self._merge(self._merge(left, equal), right)
+        return found
+
+    def rank(self, key):
+        """Number of keys strictly before key."""
+        node, before = self._root, 0
+        while node is not None:
+            if node.key < key:
+                before += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return before
+
+    def select(self, index):
+        """The key at 0-based position index."""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        node = self._root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.key
+            else:
+                index -= left + 1
+                node = node.right
+
+    def first(self, k):
+        """The k smallest keys, in order."""
+        out, stack, node = [], [], self._root
+        while (stack or node is not None) and len(out) < k:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                out.append(node.key)
+                node = node.right
+        return out
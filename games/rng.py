@@ -0,0 +1,79 @@
+import importlib.util
+import os
+import random
+
+# Blocks start small so idle rooms stay cheap, then grow for long-running streams.
+FIRST_BLOCK = 64
+MAX_BLOCK = 4096
+
+
+def new_seed():
+    # 53 bits, so seeds survive a round trip through JavaScript numbers
+    return int.from_bytes(os.urandom(8), "little") >> 11
+
+
+def _numpy_blocks(seed):
+    # imported here so servers that never draw don't pay for numpy at startup
+    import numpy as np
+
+    gen = np.random.Generator(np.random.PCG64(seed))
+    return lambda n: gen.random(n).tolist()
+
+
+def _stdlib_blocks(seed):
+    gen = random.Random(seed)
+    return lambda n: [gen.random() for _ in range(n)]
+
+
+_make_blocks = _numpy_blocks if importlib.util.find_spec("numpy") else _stdlib_blocks
+
+
+class RandomStream:
+    """
+    A seeded stream of uniform draws, pre-drawn in blocks.
+
+    Each draw is a list index; the generator only runs once per block.
+    Replaying a seed (on the same backend) reproduces every draw, so a match
+    can be re-simulated from its seed. One stream per room or request;
+    streams are not shared between threads.
+    """
+
+    def __init__(self, seed=None):
+        self.seed = new_seed() if seed is None else int(seed)
+        self.draws = 0
+        self._next_block = _make_blocks(self.seed)
+        self._block_size = FIRST_BLOCK
+        self._block = []
+        self._pos = 0
+
+    def _refill(self):
+        self._block = self._next_block(self._block_size)
+        self._pos = 0
+        self._block_size = min(self._block_size * 2, MAX_BLOCK)
+
+    def random(self):
+        if self._pos >= len(self._block):
+            self._refill()
+        u = self._block[self._pos]
+        self._pos += 1
+        self.draws += 1
+        return u
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def choices(self, population, k):
+        n = len(population)
+        return [population[int(self.random() * n)] for _ in range(k)]
+
+    def shuffle(self, x):
+        # Fisher-Yates
+        for i in range(len(x) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            x[i], x[j] = x[j], x[i]
@@ -0,0 +1,21 @@
+import threading
+import zlib
+
+
+class RoomLocks:
+    """
+    A fixed table of locks shared by all rooms.
+
+    A room always maps to the same shard, so events for one room run one at
+    a time while rooms on other shards proceed in parallel. The table never
+    grows, however many rooms come and go. Handlers must not take a second
+    room's lock while holding one; two rooms can land on different shards in
+    either order.
+    """
+
+    def __init__(self, shards=256):
+        self._locks = [threading.RLock() for _ in range(shards)]
+
+    def __call__(self, room):
+        # crc32 rather than hash() so the shard is stable across processes
+        return self._locks[zlib.crc32(room.encode()) % len(self._locks)]
@@ -0,0 +1,108 @@
+"""
+Fixed-memory summaries of event streams.
+
+HyperLogLog estimates how many distinct items it has seen (about 1.6% error
+with the default 4096 registers). DDSketch answers quantile queries to within
+a relative error (1% by default) using at most max_bins buckets. Both merge
+with another sketch of the same shape, so hourly sketches can be combined
+into a daily one.
+
+Neither is thread-safe; callers hold their own lock.
+"""
+import hashlib
+import math
+
+
+class HyperLogLog:
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def _hash(self, item):
+        return int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), "big")
+
+    def add(self, item):
+        h = self._hash(item)
+        bits = 64 - self.precision
+        index = h >> bits
+        # position of the first 1 bit in the remaining bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("can only merge sketches with the same precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def __len__(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small cardinalities: linear counting over the empty registers
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+class DDSketch:
+    """Quantiles of non-negative values; zero and below go to a separate count."""
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}          # bucket index -> count
+        self.zeros = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        # bucket first, so a value that isn't a number raises before anything changes
+        key = None if value <= 0 else math.ceil(math.log(value) / self._log_gamma)
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if key is None:
+            self.zeros += 1
+            return
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        # fold the lowest buckets together; the high quantiles keep their accuracy
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        self.bins[excess[-1]] += sum(self.bins.pop(k) for k in excess[:-1])
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("can only merge sketches with the same accuracy")
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        for bound, pick in (("min", min), ("max", max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q):
+        """The value at quantile q (0..1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return min(self.min, 0)
+        seen = self.zeros
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return max(self.min, min(value, self.max))
+        return self.max
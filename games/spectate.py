@@ -0,0 +1,89 @@
+import logging
+import threading
+
+from flask_socketio import join_room, leave_room
+
+log = logging.getLogger(__name__)
+
+
+class Spectators:
+    """
+    Throttled snapshot fan-out for watched PvP rooms.
+
+    Viewers join a separate "watch:<room>" Socket.IO room, so the players'
+    own emits are untouched. Handlers call mark(room) after a change, which
+    is a set insert (or nothing if nobody is watching). A background task
+    wakes every `interval` seconds, builds one snapshot per changed room and
+    broadcasts it once. Socket.IO encodes a room broadcast a single time, so
+    every viewer gets the same serialized packet however many there are.
+    """
+
+    def __init__(self, socketio, snapshot, interval=0.25):
+        self.socketio = socketio
+        self.snapshot = snapshot  # room -> dict, or None once the room is gone
+        self.interval = interval
+        self._watchers = {}       # room -> viewer count
+        self._watching = {}       # sid -> room
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._task = None
+
+    @staticmethod
+    def channel(room):
+        return f"watch:{room}"
+
+    def watch(self, sid, room):
+        self.unwatch(sid)
+        join_room(self.channel(room), sid=sid)
+        with self._lock:
+            self._watching[sid] = room
+            self._watchers[room] = self._watchers.get(room, 0) + 1
+            if self._task is None:
+                self._task = self.socketio.start_background_task(self._run)
+
+        # the newcomer gets the current state right away, only to them
+        snap = self.snapshot(room)
+        if snap is not None:
+            self.socketio.emit("spectate", snap, to=sid)
+
+    def unwatch(self, sid, leave=True):
+        """Stop watching. leave=False when Socket.IO already dropped the sid (disconnect)."""
+        with self._lock:
+            room = self._watching.pop(sid, None)
+            if room is None:
+                return
+            self._watchers[room] -= 1
+            if self._watchers[room] <= 0:
+                del self._watchers[room]
+                self._dirty.discard(room)
+        if leave:
+            leave_room(self.channel(room), sid=sid)
+
+    def mark(self, room):
+        if room in self._watchers:
+            self._dirty.add(room)
+
+    def watchers(self, room):
+        return self._watchers.get(room, 0)
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+
+        for room in dirty:
+            # one broken room must not stop the task that serves every other room
+            try:
+                snap = self.snapshot(room)
+                if snap is None:
+                    snap = {"room": room, "ended": True}
+                self.socketio.emit("spectate", snap, to=self.channel(room))
+            except Exception:
+                log.exception("spectate: no snapshot sent for %s", room)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("spectate: flush failed")
@@ -0,0 +1,93 @@
+"""
+Wire format for the hot PvP events.
+
+Two opt-in switches, both read from the environment at startup:
+
+    SOCKETIO_SERIALIZER=msgpack   binary Socket.IO packets instead of JSON text
+    COMPACT_PAYLOADS=1            short keys for the events in SCHEMAS
+
+They trade differently. msgpack is smaller and faster to encode than JSON
+for every hot event. Compact keys only save bytes: renaming builds a new
+dict per emit, which costs more than the shorter keys save in the encoder.
+Under msgpack, a full blackjack table shrinks from 351 to 253 bytes, but
+encoding goes from about 8 to 20 us (python -m bench.payloads). So compact
+keys stay off unless asked for, whatever the serializer; turn them on when
+bandwidth to the clients costs more than server CPU.
+
+A schema maps each long key to its short key. A (short, schema) pair marks a
+list of dicts that is compacted with another schema. Keys a schema doesn't
+list pass through unchanged. The pages receive SCHEMAS and expand payloads
+back to the long keys before their handlers see them.
+"""
+import os
+
+SERIALIZER = os.environ.get("SOCKETIO_SERIALIZER", "json")
+COMPACT = os.environ.get("COMPACT_PAYLOADS", "0") == "1"
+
+SCHEMAS = {
+    "bj_state": {
+        "active": "a", "seats": ("s", "bj_seat"), "bet": "b", "in_round": "r",
+        "hand": "h", "of": "o", "shoe": "k", "note": "n",
+    },
+    "bj_seat": {"role": "r", "cards": "c", "v": "v", "done": "d"},
+    "bj_result": {
+        "winner": "w", "winners": "ws", "bet": "b", "values": "v", "payouts": "p",
+        "series": "s", "hand": "h", "series_over": "o", "reason": "r", "seed": "sd",
+    },
+    "result": {"winner": "w", "loser": "l", "bet": "b", "seed": "s"},
+    "odds": {"max": "m", "lose": "l", "win": "w"},
+}
+
+
+def _tables(expand):
+    # per event: key rename map, plus the (key, schema) pairs holding nested lists
+    renames, lists = {}, {}
+    for event, schema in SCHEMAS.items():
+        rename, nested = {}, []
+        for long_key, spec in schema.items():
+            short_key, sub = spec if isinstance(spec, tuple) else (spec, None)
+            src, dst = (short_key, long_key) if expand else (long_key, short_key)
+            rename[src] = dst
+            if sub:
+                nested.append((dst, sub))
+        renames[event], lists[event] = rename, nested
+    return renames, lists
+
+
+_COMPACT = _tables(False)
+_EXPAND = _tables(True)
+
+
+def _convert(tables, event, payload):
+    renames, lists = tables
+    rename = renames.get(event)
+    if rename is None or not isinstance(payload, dict):
+        return payload
+    out = {rename.get(k, k): v for k, v in payload.items()}
+    for key, sub in lists[event]:
+        value = out.get(key)
+        if isinstance(value, list):
+            out[key] = [_convert(tables, sub, v) for v in value]
+    return out
+
+
+def compact(event, payload):
+    return _convert(_COMPACT, event, payload)
+
+
+def expand(event, payload):
+    return _convert(_EXPAND, event, payload)
+
+
+def pack(event, payload):
+    """The payload to emit for `event` under the configured wire format."""
+    return compact(event, payload) if COMPACT else payload
+
+
+def socketio_options():
+    return {"serializer": "msgpack"} if SERIALIZER == "msgpack" else {}
+
+
+def client_config():
+    """Template context for the PvP pages."""
+    return {"msgpack": SERIALIZER == "msgpack", "schemas": SCHEMAS if COMPACT else {}}
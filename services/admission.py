@@ -0,0 +1,186 @@
+"""
+Admission control for Socket.IO events.
+
+Every handler belongs to an event class. Each connection gets a token bucket
+per class, so one client can't flood a handler. A background task also
+measures event-loop lag: how late a short sleep wakes up. Past the class's
+threshold, new events of that class are shed before their handlers run.
+Chat goes first, then queue joins and spectating. Game actions are never
+shed, only rate-limited, so in-match latency stays bounded while the
+optional work waits.
+
+Handlers for different connections never share a lock here: each
+connection's buckets and counters sit behind its own lock, and latency
+samples go to per-class deques whose append is atomic. The registry lock is
+only taken to start the monitor, on disconnect, and by stats().
+
+ADMISSION_CONTROL=0 turns both off (handlers then run unconditionally).
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+from flask import request
+
+# class -> (tokens per second, burst)
+RATES = {
+    "game": (10.0, 20),
+    "queue": (1.0, 3),
+    "chat": (3.0, 5),
+    "watch": (2.0, 5),
+}
+
+# class -> lag in ms at which new events of that class are dropped
+SHED_AT_MS = {
+    "chat": 50,
+    "queue": 100,
+    "watch": 100,
+}
+
+ENABLED = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+
+LAG_INTERVAL = 0.05
+LAG_SMOOTHING = 0.3
+LATENCY_SAMPLES = 2048
+
+NOTICES = {
+    "rate": "Slow down.",
+    "shed": "The server is busy. Try again in a moment.",
+}
+
+
+class _Client:
+    """Admission state of one connection, guarded by its own lock."""
+
+    __slots__ = ("lock", "buckets", "counts", "noticed")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}       # class -> [tokens, last refill]
+        self.counts = {}        # (class, verdict) -> events
+        self.noticed = 0.0      # monotonic time of the last notice
+
+
+class Admission:
+    def __init__(self, socketio, rates=RATES, shed_at=SHED_AT_MS, enabled=ENABLED):
+        self.socketio = socketio
+        self.enabled = enabled
+        self.rates = rates
+        self.shed_at = shed_at
+        self.lag_ms = 0.0
+        self._clients = {}      # sid -> _Client
+        self._lock = threading.Lock()
+        self._task = None
+        self._gone = {}         # (class, verdict) -> events of connections already forgotten
+        self._latency = {cls: deque(maxlen=LATENCY_SAMPLES) for cls in rates}
+
+    # ---------------- Lag monitor ----------------
+
+    def _monitor(self):
+        while True:
+            started = time.perf_counter()
+            self.socketio.sleep(LAG_INTERVAL)
+            late = max(0.0, time.perf_counter() - started - LAG_INTERVAL) * 1000
+            self.lag_ms += LAG_SMOOTHING * (late - self.lag_ms)
+
+    def _ensure_monitor(self):
+        if self._task is None:
+            with self._lock:
+                if self._task is None:
+                    self._task = self.socketio.start_background_task(self._monitor)
+
+    # ---------------- Admission ----------------
+
+    def _client(self, sid):
+        client = self._clients.get(sid)
+        if client is None:
+            # setdefault is atomic, so two first events of a sid get the same state
+            client = self._clients.setdefault(sid, _Client())
+        return client
+
+    def check(self, sid, cls):
+        """None if the event may run, else "rate" or "shed"."""
+        self._ensure_monitor()
+        limit = self.shed_at.get(cls)
+        shed = limit is not None and self.lag_ms > limit
+        rate, burst = self.rates[cls]
+        now = time.monotonic()
+        client = self._client(sid)
+        with client.lock:
+            if shed:
+                verdict = "shed"
+            else:
+                bucket = client.buckets.setdefault(cls, [burst, now])
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                verdict = None if bucket[0] >= 1 else "rate"
+                if verdict is None:
+                    bucket[0] -= 1
+            key = (cls, "admitted" if verdict is None else verdict)
+            client.counts[key] = client.counts.get(key, 0) + 1
+        return verdict
+
+    def _notify(self, sid, notice, verdict):
+        # one notice per second at most, or the notices become the flood
+        now = time.monotonic()
+        client = self._client(sid)
+        with client.lock:
+            if now - client.noticed < 1:
+                return
+            client.noticed = now
+        self.socketio.emit(notice, NOTICES[verdict], to=sid)
+
+    def admit(self, cls, notice=None):
+        """
+        Decorator for a Socket.IO handler; put it under @socketio.on.
+        notice: event to tell the client why its event was dropped.
+        """
+        def decorator(handler):
+            @functools.wraps(handler)
+            def wrapped(*args):
+                if not self.enabled:
+                    return handler(*args)
+                sid = request.sid
+                verdict = self.check(sid, cls)
+                if verdict is not None:
+                    if notice:
+                        self._notify(sid, notice, verdict)
+                    return None
+                started = time.perf_counter()
+                try:
+                    return handler(*args)
+                finally:
+                    self._latency[cls].append(time.perf_counter() - started)
+            return wrapped
+        return decorator
+
+    def forget(self, sid):
+        # the counts outlive the connection, folded into the totals
+        with self._lock:
+            client = self._clients.pop(sid, None)
+            if client is not None:
+                with client.lock:
+                    for key, n in client.counts.items():
+                        self._gone[key] = self._gone.get(key, 0) + n
+
+    def stats(self):
+        counts = {cls: {"admitted": 0, "rate": 0, "shed": 0} for cls in self.rates}
+        with self._lock:
+            totals = dict(self._gone)
+            clients = list(self._clients.values())
+        for client in clients:
+            with client.lock:
+                for key, n in client.counts.items():
+                    totals[key] = totals.get(key, 0) + n
+        for (cls, verdict), n in totals.items():
+            counts[cls][verdict] += n
+
+        classes = {}
+        for cls in self.rates:
+            # copying a deque runs without releasing the GIL, so appends can't interleave
+            samples = sorted(self._latency[cls])
+            p99 = samples[int(len(samples) * 0.99)] * 1000 if samples else None
+            classes[cls] = {**counts[cls], "p99_ms": p99}
+        return {"lag_ms": self.lag_ms, "classes": classes}
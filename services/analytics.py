@@ -0,0 +1,179 @@
+"""
+Streaming gameplay analytics in fixed memory.
+
+Game handlers call player(), match() and bet(). Each call only puts a tuple
+on a bounded queue (dropped and counted when full, never blocking a
+handler). A background thread folds the events into sketches, one window
+per game per hour:
+
+    players    HyperLogLog of distinct players (their ledger id, else the sid)
+    length     DDSketch of match length (deathroll rolls, blackjack hands)
+    bets       DDSketch of settled bets
+
+The last ANALYTICS_HOURS windows are kept, so memory stays bounded however
+long the server runs. Every ANALYTICS_SNAPSHOT_INTERVAL seconds the thread
+summarizes the windows into a snapshot: the current hour, the retained hours
+merged, and one row per hour. GET /admin/analytics serves the latest
+snapshot without touching the sketches. Like the profiler, it needs the
+X-Admin-Token header.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import Blueprint, current_app, jsonify
+
+from games.sketches import DDSketch, HyperLogLog
+from services.profiler import require_admin
+
+bp = Blueprint("analytics", __name__)
+bp.before_request(require_admin)
+
+HOURS = int(os.environ.get("ANALYTICS_HOURS", 24))
+SNAPSHOT_INTERVAL = float(os.environ.get("ANALYTICS_SNAPSHOT_INTERVAL", 10))
+MAX_PENDING = 10000
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class _Window:
+    def __init__(self, hour):
+        self.hour = hour
+        self.games = {}     # game -> {"players": HyperLogLog, "length": DDSketch, "bets": DDSketch}
+
+    def game(self, name):
+        sketches = self.games.get(name)
+        if sketches is None:
+            sketches = self.games[name] = {
+                "players": HyperLogLog(), "length": DDSketch(), "bets": DDSketch(),
+            }
+        return sketches
+
+
+def _distribution(sketch):
+    summary = {"count": sketch.count, "min": sketch.min, "max": sketch.max}
+    for q in QUANTILES:
+        value = sketch.quantile(q)
+        summary[f"p{round(q * 100)}"] = round(value, 2) if value is not None else None
+    return summary
+
+
+def _summary(games):
+    return {
+        name: {
+            "players": len(s["players"]),
+            "length": _distribution(s["length"]),
+            "bets": _distribution(s["bets"]),
+        }
+        for name, s in games.items()
+    }
+
+
+def _merged(windows):
+    games = {}
+    for window in windows:
+        for name, sketches in window.games.items():
+            if name not in games:
+                games[name] = {"players": HyperLogLog(), "length": DDSketch(), "bets": DDSketch()}
+            for kind, sketch in sketches.items():
+                games[name][kind].merge(sketch)
+    return games
+
+
+def _hour_label(hour):
+    return datetime.fromtimestamp(hour * 3600, timezone.utc).isoformat()
+
+
+class Analytics:
+    def __init__(self, hours=HOURS, snapshot_interval=SNAPSHOT_INTERVAL, max_pending=MAX_PENDING):
+        self.snapshot_interval = snapshot_interval
+        self.dropped = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._windows = deque(maxlen=hours)
+        self._snapshot = self._summarize()
+        self._thread = None
+
+    def init_app(self, app):
+        app.extensions["analytics"] = self
+        app.register_blueprint(bp)
+        self.logger = app.logger
+        self._thread = threading.Thread(target=self._run, name="analytics", daemon=True)
+        self._thread.start()
+
+    # ---------------- Recording (called from handlers) ----------------
+
+    def player(self, game, player):
+        self._put(("players", game, player))
+
+    def match(self, game, length):
+        self._put(("length", game, length))
+
+    def bet(self, game, amount):
+        self._put(("bets", game, amount))
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait((time.time(),) + event)
+        except queue.Full:
+            self.dropped += 1
+
+    # ---------------- Aggregation (background thread) ----------------
+
+    def _window(self, hour):
+        if not self._windows or self._windows[-1].hour < hour:
+            self._windows.append(_Window(hour))
+        return self._windows[-1]
+
+    def _apply(self, ts, kind, game, value):
+        sketch = self._window(int(ts // 3600)).game(game)[kind]
+        sketch.add(value)
+
+    def _run(self):
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        while True:
+            try:
+                event = self._queue.get(timeout=max(0, next_snapshot - time.monotonic()))
+            except queue.Empty:
+                event = None
+            # one bad event or snapshot must not stop the thread, or the queue fills for good
+            if event is not None:
+                try:
+                    self._apply(*event)
+                except Exception:
+                    self.failed += 1
+                    self.logger.exception("analytics event %r not applied", event)
+            if time.monotonic() >= next_snapshot:
+                try:
+                    self._snapshot = self._summarize()
+                except Exception:
+                    self.logger.exception("analytics snapshot failed")
+                next_snapshot = time.monotonic() + self.snapshot_interval
+
+    def _summarize(self):
+        windows = list(self._windows)
+        current = windows[-1] if windows and windows[-1].hour == int(time.time() // 3600) else None
+        return {
+            "taken": datetime.now(timezone.utc).isoformat(),
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "current_hour": _summary(current.games) if current else {},
+            "retained": _summary(_merged(windows)),
+            "hours": [
+                {"hour": _hour_label(w.hour),
+                 "players": {name: len(s["players"]) for name, s in w.games.items()}}
+                for w in windows
+            ],
+        }
+
+    def snapshot(self):
+        return self._snapshot
+
+
+@bp.route("/admin/analytics")
+def analytics_snapshot():
+    return jsonify(current_app.extensions["analytics"].snapshot())
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """One in-progress conversion that other requests for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class ConvertCache:
+    """
+    Content-addressed on-disk cache of converted outputs.
+
+    Entries are files named by their key inside `root`. The total size is kept
+    under `max_bytes` by evicting the least recently used entries, and
+    concurrent requests for the same key share a single conversion.
+
+    Hits are returned as files opened under the lock, so an eviction by a
+    concurrent request can unlink the entry but never pull it out from under
+    a response that is still being sent.
+
+    Conversions write to `<key>.tmp-<pid>-<thread>` and rename into place.
+    Every worker process shares the directory, so a temp file is only swept
+    once its process is gone or it is older than `stale_after` seconds.
+    """
+
+    def __init__(self, root, max_bytes, stale_after=600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, oldest first
+        self._size = 0
+        self._inflight = {}
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def _load(self):
+        found = []
+        for entry in os.scandir(self.root):
+            if not entry.is_file():
+                continue
+            if ".tmp" in entry.name:
+                if self._abandoned(entry):
+                    _remove(entry.path)
+                continue
+            st = entry.stat()
+            found.append((st.st_atime, entry.name, st.st_size))
+
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._size += size
+        self._evict()
+
+    def _abandoned(self, entry):
+        """True for a temp file left behind by a conversion that never finished."""
+        try:
+            if time.time() - entry.stat().st_mtime > self.stale_after:
+                return True
+            pid = int(entry.name.rsplit(".tmp-", 1)[1].split("-")[0])
+        except (OSError, IndexError, ValueError):
+            return False
+        return not _pid_alive(pid)
+
+    def _evict(self):
+        # callers hold the lock (or are still in __init__); the newest entry is never evicted
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            _remove(self.path(old_key))
+
+    def _open(self, key):
+        # callers hold the lock; an entry another process removed is forgotten
+        try:
+            return open(self.path(key), "rb")
+        except FileNotFoundError:
+            self._size -= self._entries.pop(key, 0)
+            return None
+
+    def get(self, key):
+        """Return the cached entry for key as an open binary file, or None on a miss."""
+        path = self.path(key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            elif os.path.exists(path):
+                # written by another worker process sharing the directory
+                self._entries[key] = os.path.getsize(path)
+                self._size += self._entries[key]
+                self._evict()
+            else:
+                return None
+            fh = self._open(key)
+
+        if fh is not None:
+            try:
+                os.utime(path)  # keeps LRU order across restarts
+            except OSError:
+                pass
+        return fh
+
+    def get_or_create(self, key, produce):
+        """
+        Return the cached entry for key as an open binary file, calling
+        produce(tmp_path) on a miss. Only one produce() runs per key;
+        concurrent callers wait for its result.
+        """
+        while True:
+            fh = self.get(key)
+            if fh:
+                return fh
+
+            with self._lock:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            # the result is on disk now, unless it was already evicted again
+
+        path = self.path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            produce(tmp_path)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+            with self._lock:
+                if key not in self._entries:
+                    self._size += size
+                self._entries[key] = size
+                self._entries.move_to_end(key)
+                fh = self._open(key)
+                self._evict()
+            if fh is None:
+                raise FileNotFoundError(path)
+            return fh
+        except BaseException as e:
+            flight.error = e
+            _remove(tmp_path)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True     # exists, owned by someone else
+    return True
@@ -0,0 +1,396 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, current_app, render_template, request, send_file
+
+from services.convert_cache import ConvertCache
+
+bp = Blueprint("imgconvert", __name__)
+
+# ---------------- Formats ----------------
+
+FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "gif": ("GIF", "image/gif"),
+    "bmp": ("BMP", "image/bmp"),
+    "tiff": ("TIFF", "image/tiff"),
+    "ico": ("ICO", "image/x-icon"),
+}
+
+# formats that cannot store an alpha channel
+NO_ALPHA = {"JPEG", "BMP"}
+
+# formats whose output depends on the quality setting
+LOSSY = {"JPEG", "WEBP"}
+
+# ---------------- Limits ----------------
+
+POOL_WORKERS = int(os.environ.get("IMGCONVERT_WORKERS", 2))
+QUEUE_DEPTH = int(os.environ.get("IMGCONVERT_QUEUE_DEPTH", 8))
+MAX_UPLOAD_BYTES = int(os.environ.get("IMGCONVERT_MAX_UPLOAD", 25 * 1024 * 1024))
+MAX_PIXELS = int(os.environ.get("IMGCONVERT_MAX_PIXELS", 40_000_000))
+JOB_MEMORY_BYTES = int(os.environ.get("IMGCONVERT_JOB_MEMORY", 1024 * 1024 * 1024))
+MAX_RENDITIONS = 24
+JOB_TIMEOUT = 60
+RETRY_AFTER = 5
+CHUNK_SIZE = 64 * 1024
+
+CACHE_DIR = os.environ.get(
+    "IMGCONVERT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "imgconvert-cache")
+)
+CACHE_MAX_BYTES = int(os.environ.get("IMGCONVERT_CACHE_BYTES", 512 * 1024 * 1024))
+CACHE_MAX_AGE = 24 * 3600
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class ImageRejected(Exception):
+    def __init__(self, message, status=400):
+        # both values go to args so the error survives the trip back from a worker
+        super().__init__(message, status)
+        self.message = message
+        self.status = status
+
+    def __str__(self):
+        return self.message
+
+
+# ---------------- Worker side ----------------
+
+def _init_worker(memory_bytes, max_pixels):
+    # cap the heap of each worker so one huge image can only kill its own job
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_bytes, memory_bytes))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+def _open_checked(src_path):
+    from PIL import Image
+
+    img = Image.open(src_path)
+    # Image.open only reads the header, so this runs before any pixels are decoded
+    if img.width * img.height > MAX_PIXELS:
+        raise ImageRejected(f"Image is larger than {MAX_PIXELS:,} pixels.", 413)
+    return img
+
+
+def _prepare(img, pil_format):
+    if pil_format in NO_ALPHA and img.mode not in ("RGB", "L"):
+        return img.convert("RGB")
+    if img.mode == "P" and pil_format not in ("PNG", "GIF"):
+        return img.convert("RGBA")
+    return img
+
+
+def _save_kwargs(pil_format, quality):
+    if pil_format in LOSSY:
+        return {"quality": quality}
+    return {}
+
+
+def quality_key(formats, quality):
+    """quality as it affects the output: None when no format uses it, so PNG et al. share one entry."""
+    return quality if any(FORMATS[fmt][0] in LOSSY for fmt in formats) else None
+
+
+def convert_file(src_path, dst_path, fmt, quality):
+    """
+    Runs inside a pool worker.
+    src_path: uploaded image on disk
+    dst_path: where the converted image is written
+    returns: (width, height)
+    """
+    from PIL import Image
+
+    pil_format = FORMATS[fmt][0]
+    try:
+        with _open_checked(src_path) as img:
+            img.load()
+            out = _prepare(img, pil_format)
+            out.save(dst_path, pil_format, **_save_kwargs(pil_format, quality))
+            return img.size
+    except (Image.DecompressionBombError, MemoryError):
+        raise ImageRejected("Image is too large to convert.", 413)
+    except (OSError, ValueError, SyntaxError):
+        raise ImageRejected("Could not read that image.")
+
+
+def render_zip(src_path, dst_path, sizes, formats, quality, stem):
+    """
+    Runs inside a pool worker.
+    Decodes the source once and writes every size x format into one zip.
+    sizes: list of {"scale", "w", "h"} from resolution_convert
+    returns: number of files written
+    """
+    from PIL import Image
+
+    count = 0
+    try:
+        with _open_checked(src_path) as img:
+            img.load()
+            with zipfile.ZipFile(dst_path, "w", zipfile.ZIP_STORED) as zf:
+                for size in sizes:
+                    w, h = size["w"], size["h"]
+                    scaled = img if (w, h) == img.size else img.resize((w, h), Image.LANCZOS)
+                    for fmt in formats:
+                        pil_format = FORMATS[fmt][0]
+                        # only the rendition being written is held in memory
+                        buf = io.BytesIO()
+                        _prepare(scaled, pil_format).save(
+                            buf, pil_format, **_save_kwargs(pil_format, quality)
+                        )
+                        zf.writestr(f"{stem}@{size['scale']:g}x.{fmt}", buf.getvalue())
+                        count += 1
+                    del scaled
+    except (Image.DecompressionBombError, MemoryError):
+        raise ImageRejected("Image is too large to convert.", 413)
+    except (OSError, ValueError, SyntaxError):
+        raise ImageRejected("Could not read that image.")
+    return count
+
+
+def image_size(path):
+    """Read (width, height) from the image header without decoding pixels."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except (OSError, ValueError, SyntaxError):
+        raise ImageRejected("Could not read that image.")
+
+
+# ---------------- Pool ----------------
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(QUEUE_DEPTH)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=POOL_WORKERS,
+                initializer=_init_worker,
+                initargs=(JOB_MEMORY_BYTES, MAX_PIXELS),
+            )
+        return _pool
+
+
+def _reset_pool(pool):
+    # a worker killed by the memory cap breaks the whole executor
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_job(fn, *args):
+    """
+    Run fn(*args) in the conversion pool and wait for it.
+    Raises PoolBusy when QUEUE_DEPTH jobs are already queued or running.
+    """
+    if not _slots.acquire(blocking=False):
+        raise PoolBusy()
+
+    pool = _get_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        _reset_pool(pool)
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+
+    try:
+        return future.result(timeout=JOB_TIMEOUT)
+    except ImageRejected:
+        raise
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool(pool)
+        raise ImageRejected("Conversion failed.", 500)
+
+
+# ---------------- Cache ----------------
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            # a conversion outliving JOB_TIMEOUT was given up on, so its temp file can go
+            _cache = ConvertCache(CACHE_DIR, CACHE_MAX_BYTES, stale_after=JOB_TIMEOUT)
+        return _cache
+
+
+# ---------------- Uploads and responses ----------------
+
+def _too_large():
+    return ImageRejected(f"Uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.", 413)
+
+
+def check_upload_size():
+    """Reject a request whose declared length is over the limit, before its form is parsed."""
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+
+def save_upload(upload, suffix=""):
+    """
+    Write an uploaded file to a temp file in chunks, at most MAX_UPLOAD_BYTES
+    (a chunked request has no Content-Length to check up front).
+    returns: (path, sha256 hex digest of the contents)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="imgconvert-", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            while True:
+                chunk = upload.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large()
+                digest.update(chunk)
+                fh.write(chunk)
+    except BaseException:
+        _remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def send_cached(fh, key, mimetype, download_name):
+    # send_file hands the open file to the server's file wrapper (sendfile where
+    # supported) and closes it when the response is done
+    return send_file(
+        fh,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        etag=key,
+        max_age=CACHE_MAX_AGE,
+    )
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def output_name(filename, fmt):
+    stem = os.path.splitext(os.path.basename(filename or ""))[0] or "image"
+    return f"{stem}.{fmt}"
+
+
+def renditions_response(upload, formats, quality, sizer):
+    """
+    Convert one upload into every size and format and send them as a zip.
+    sizer: called with the source (width, height), returns [{"scale", "w", "h"}, ...]
+    Raises PoolBusy, or ImageRejected for bad input (an upload over MAX_UPLOAD_BYTES included).
+    """
+    formats = list(dict.fromkeys(formats))
+    if not formats or any(fmt not in FORMATS for fmt in formats):
+        raise ImageRejected("Unsupported output format.")
+
+    src_path, digest = save_upload(upload)
+    try:
+        sizes = sizer(*image_size(src_path))
+        if len(sizes) * len(formats) > MAX_RENDITIONS:
+            raise ImageRejected(f"At most {MAX_RENDITIONS} renditions per upload.")
+        for size in sizes:
+            if size["w"] < 1 or size["h"] < 1 or size["w"] * size["h"] > MAX_PIXELS:
+                raise ImageRejected(f"{size['scale']:g}x is outside the allowed size.", 413)
+
+        spec = ",".join(f"{s['scale']:g}:{s['w']}x{s['h']}" for s in sizes)
+        stem = os.path.splitext(output_name(upload.filename, "zip"))[0]
+        # the stem names every entry inside the zip, so it is part of the output
+        key = ConvertCache.key(
+            digest, "renditions", spec, ",".join(formats), quality_key(formats, quality), stem
+        )
+        fh = get_cache().get_or_create(
+            key,
+            lambda dst_path: run_job(render_zip, src_path, dst_path, sizes, formats, quality, stem),
+        )
+    finally:
+        _remove(src_path)
+
+    return send_cached(fh, key, "application/zip", f"{stem}-renditions.zip")
+
+
+def error_page(error, status):
+    headers = {"Retry-After": str(RETRY_AFTER)} if status == 429 else {}
+    return render_template("imgconvert.html", formats=FORMATS, error=error), status, headers
+
+
+# ---------------- Routes ----------------
+
+@bp.route("/imgconvert", methods=["GET", "POST"])
+def imgconvert():
+    if request.method == "GET":
+        return render_template("imgconvert.html", formats=FORMATS, error=None)
+
+    try:
+        check_upload_size()
+    except ImageRejected as e:
+        return error_page(str(e), e.status)
+
+    upload = request.files.get("image")
+    fmt = request.form.get("format", "png").lower()
+    if not upload or not upload.filename:
+        return error_page("Choose an image to convert.", 400)
+    if fmt not in FORMATS:
+        return error_page("Unsupported output format.", 400)
+
+    try:
+        quality = max(1, min(100, int(request.form.get("quality") or 90)))
+    except ValueError:
+        return error_page("Quality must be a number from 1 to 100.", 400)
+
+    try:
+        src_path, digest = save_upload(upload)
+    except ImageRejected as e:
+        return error_page(str(e), e.status)
+    key = ConvertCache.key(digest, fmt, quality_key([fmt], quality))
+
+    try:
+        fh = get_cache().get_or_create(
+            key, lambda dst_path: run_job(convert_file, src_path, dst_path, fmt, quality)
+        )
+    except PoolBusy:
+        return error_page("The converter is busy. Try again in a few seconds.", 429)
+    except ImageRejected as e:
+        return error_page(str(e), e.status)
+    except OSError:
+        # the cache directory failed us (disk full, a file removed underneath), not the image
+        current_app.logger.exception("imgconvert: cache write failed for %s", key)
+        return error_page("Conversion failed. Try again in a few seconds.", 500)
+    finally:
+        _remove(src_path)
+
+    return send_cached(fh, key, FORMATS[fmt][1], output_name(upload.filename, fmt))
@@ -0,0 +1,169 @@
+"""
+Optional game and service modules, loaded off the startup path.
+
+Plugins are registered by dotted target ("package.module:attr") so nothing is
+imported at registration time. start() imports them on a background thread
+while the rest of the app finishes importing. Only the import runs there:
+Flask's routing tables aren't thread-safe, so registering blueprints and
+calling init targets waits for finish(). That runs once, either from wait()
+on the main thread before the server starts, or from the WSGI gate ahead of
+the first request, before Flask considers setup over. A plugin that is
+missing or raises while loading is logged and skipped; the rest of the site
+keeps working.
+
+Set PLUGINS_EAGER=1 to load everything inline instead (useful when the
+server forks workers after import).
+"""
+import importlib
+import os
+import threading
+import time
+
+LOAD_TIMEOUT = float(os.environ.get("PLUGINS_LOAD_TIMEOUT", 30))
+EAGER = os.environ.get("PLUGINS_EAGER") == "1"
+
+
+class Plugin:
+    def __init__(self, name, target, kind, probe):
+        self.name = name
+        self.target = target
+        self.kind = kind          # "blueprint" or "init"
+        self.probe = probe        # a URL that exercises the plugin, for benchmarks
+        self.module = None
+        self.target_obj = None    # the imported attribute, registered by finish()
+        self.error = None
+        self.import_ms = None
+        self.setup_ms = None
+
+    @property
+    def status(self):
+        if self.error:
+            return "failed"
+        return "loaded" if self.setup_ms is not None else "pending"
+
+
+class PluginRegistry:
+    def __init__(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self._plugins = {}
+        self._imported = threading.Event()
+        self._ready = threading.Event()
+        self._finish_lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        self.load_ms = None
+        self.first_wait_ms = None
+
+    def blueprint(self, name, target, probe=None):
+        """target is a Flask Blueprint; registered on the app once imported."""
+        self._plugins[name] = Plugin(name, target, "blueprint", probe)
+
+    def init(self, name, target, probe=None):
+        """target is called as target(app, socketio) once imported."""
+        self._plugins[name] = Plugin(name, target, "init", probe)
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        if EAGER:
+            self._import_all()
+            self.finish()
+            return
+        # Flask refuses new routes once it has served a request, so the gate
+        # registers every plugin before the first request is dispatched
+        self.app.wsgi_app = self._gate(self.app.wsgi_app)
+        self._thread = threading.Thread(target=self._import_all, name="plugins", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=LOAD_TIMEOUT):
+        """Wait for the imports and register the plugins; call before serving."""
+        self.finish(timeout)
+        return self._ready.is_set()
+
+    def finish(self, timeout=LOAD_TIMEOUT):
+        """Register every imported plugin on the calling thread, once."""
+        if self._ready.is_set():
+            return
+        with self._finish_lock:
+            if self._ready.is_set():
+                return
+            self._imported.wait(timeout)
+            try:
+                for plugin in list(self._plugins.values()):
+                    self._setup(plugin)
+            finally:
+                self.load_ms = (time.perf_counter() - self._started_at) * 1000
+                self._ready.set()
+
+    def module(self, name):
+        """The plugin's module, or None if it failed to load."""
+        self.wait()
+        plugin = self._plugins.get(name)
+        return plugin.module if plugin and not plugin.error else None
+
+    def stats(self):
+        return {
+            "load_ms": self.load_ms,
+            "first_wait_ms": self.first_wait_ms,
+            "plugins": [
+                {
+                    "name": p.name,
+                    "kind": p.kind,
+                    "status": p.status,
+                    "import_ms": p.import_ms,
+                    "setup_ms": p.setup_ms,
+                    "probe": p.probe,
+                    "error": p.error,
+                }
+                for p in self._plugins.values()
+            ],
+        }
+
+    def _gate(self, wsgi_app):
+        def gated(environ, start_response):
+            if not self._ready.is_set():
+                started = time.perf_counter()
+                self.finish()
+                if self.first_wait_ms is None:
+                    self.first_wait_ms = (time.perf_counter() - started) * 1000
+            return wsgi_app(environ, start_response)
+        return gated
+
+    def _import_all(self):
+        try:
+            for plugin in list(self._plugins.values()):
+                self._import(plugin)
+        finally:
+            self._imported.set()
+
+    def _import(self, plugin):
+        module_name, _, attr = plugin.target.partition(":")
+        started = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+            plugin.target_obj = getattr(module, attr)
+            plugin.import_ms = (time.perf_counter() - started) * 1000
+            plugin.module = module
+        except Exception as e:
+            self._fail(plugin, e)
+
+    def _setup(self, plugin):
+        if plugin.error:
+            return
+        if plugin.module is None:
+            # still importing after the timeout; too late to register with Flask
+            self._fail(plugin, TimeoutError(f"import took longer than {LOAD_TIMEOUT:g}s"))
+            return
+        started = time.perf_counter()
+        try:
+            if plugin.kind == "blueprint":
+                self.app.register_blueprint(plugin.target_obj)
+            else:
+                plugin.target_obj(self.app, self.socketio)
+            plugin.setup_ms = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            self._fail(plugin, e)
+
+    def _fail(self, plugin, e):
+        plugin.error = f"{type(e).__name__}: {e}"
+        self.app.logger.warning("plugin %s not loaded: %s", plugin.name, plugin.error)
@@ -0,0 +1,242 @@
+"""
+On-demand sampling profiler for a live server.
+
+POST /admin/profile?seconds=10 starts a sampling window. A background thread
+reads every thread's stack at `hz` samples per second. It keeps the stacks
+that are inside a Flask view or a Socket.IO handler, rooted at a
+"route:<endpoint>" or "event:<name>" frame. tracemalloc runs for the same
+window. When the window closes the results are written to PROFILE_DIR:
+
+    profile-<time>.collapsed    collapsed stacks; feed to flamegraph.pl or speedscope
+    profile-<time>.alloc.txt    top allocations from the game code, plus the
+                                size of every structure registered with watch()
+
+Every endpoint needs the X-Admin-Token header to match ADMIN_TOKEN. With
+ADMIN_TOKEN unset the endpoints do not exist (404).
+"""
+import hmac
+import inspect
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from flask import Blueprint, abort, current_app, jsonify, request, send_file
+
+bp = Blueprint("profiler", __name__)
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+MIN_SECONDS, MAX_SECONDS = 0.1, 120
+MIN_HZ, MAX_HZ = 1, 1000
+TOP_ALLOCATIONS = 25
+
+# name -> container, reported in the allocation file
+_watched = {}
+
+_lock = threading.Lock()
+_state = {"running": False, "until": None, "last": None, "error": None}
+
+
+def watch(**structures):
+    """Register shared containers (rooms, queues, ...) to size in each report."""
+    _watched.update(structures)
+
+
+# ---------------- Sampling ----------------
+
+def _handler_labels(app):
+    """code object -> label for every view function and Socket.IO handler."""
+    labels = {}
+    for endpoint, view in app.view_functions.items():
+        labels[inspect.unwrap(view).__code__] = f"route:{endpoint}"
+    socketio = app.extensions.get("socketio")
+    if socketio is not None and socketio.server is not None:
+        for namespace, handlers in socketio.server.handlers.items():
+            for event, handler in handlers.items():
+                prefix = "" if namespace == "/" else namespace
+                labels[inspect.unwrap(handler).__code__] = f"event:{prefix}{event}"
+    return labels
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, labels):
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+
+    for i, code in enumerate(codes):
+        label = labels.get(code)
+        if label:
+            return ";".join([label] + [_frame_name(c) for c in codes[i:]])
+    return None
+
+
+def _sample(labels, seconds, interval):
+    own = threading.get_ident()
+    stacks = Counter()
+    ticks = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = _collapse(frame, labels)
+            if stack:
+                stacks[stack] += 1
+        ticks += 1
+        time.sleep(interval)
+    return stacks, ticks
+
+
+# ---------------- Reports ----------------
+
+def _deep_size(obj, seen, depth=0):
+    if id(obj) in seen or depth > 8:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in list(obj.items()):
+            size += _deep_size(key, seen, depth + 1) + _deep_size(value, seen, depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in list(obj):
+            size += _deep_size(item, seen, depth + 1)
+    return size
+
+
+def _structure_lines():
+    lines = []
+    for name, obj in _watched.items():
+        try:
+            size = _deep_size(obj, set())
+        except RuntimeError:  # resized by a handler mid-walk; the next report will catch it
+            size = None
+        shown = f"{size / 1024:10.1f} KiB" if size is not None else "         ? KiB"
+        lines.append(f"{name:<20} {len(obj):>8} items {shown}")
+    return lines
+
+
+def _allocation_report(snapshot, root):
+    game_code = snapshot.filter_traces([
+        tracemalloc.Filter(True, os.path.join(root, "app.py")),
+        tracemalloc.Filter(True, os.path.join(root, "games", "*")),
+    ])
+    lines = ["# shared structures", *_structure_lines(), "", "# allocations by game code"]
+    for stat in game_code.statistics("lineno")[:TOP_ALLOCATIONS]:
+        lines.append(str(stat))
+    lines += ["", "# allocations by any code"]
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+def _run(labels, seconds, interval, root, logger):
+    last, error = None, None
+    try:
+        last = _profile(labels, seconds, interval, root)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logger.exception("profile failed")
+    finally:
+        # always free the slot, or every later request would get a 409
+        with _lock:
+            _state["running"] = False
+            _state["until"] = None
+            _state["error"] = error
+            if last:
+                _state["last"] = last
+
+
+def _profile(labels, seconds, interval, root):
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        stacks, ticks = _sample(labels, seconds, interval)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S"))
+    with open(base + ".collapsed", "w") as fh:
+        for stack, count in stacks.most_common():
+            fh.write(f"{stack} {count}\n")
+    with open(base + ".alloc.txt", "w") as fh:
+        fh.write(_allocation_report(snapshot, root))
+
+    busy = Counter()
+    for stack, count in stacks.items():
+        busy[stack.split(";", 1)[0]] += count
+    return {
+        "collapsed": base + ".collapsed",
+        "allocations": base + ".alloc.txt",
+        "seconds": seconds,
+        "ticks": ticks,
+        "samples": sum(stacks.values()),
+        "handlers": dict(busy.most_common(20)),
+    }
+
+
+# ---------------- Routes ----------------
+
+@bp.before_request
+def require_admin():
+    supplied = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        abort(403)
+
+
+@bp.route("/admin/profile", methods=["GET", "POST"])
+def profile():
+    if request.method == "GET":
+        with _lock:
+            return jsonify(_state)
+
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        hz = float(request.args.get("hz", 100))
+        if not (seconds > 0 and hz > 0) or math.isinf(seconds) or math.isinf(hz):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "seconds and hz must be positive numbers"}), 400
+    # a tiny hz would sleep for days between samples and hold the only slot
+    seconds = max(MIN_SECONDS, min(seconds, MAX_SECONDS))
+    hz = max(MIN_HZ, min(hz, MAX_HZ))
+
+    with _lock:
+        if _state["running"]:
+            return jsonify({"error": "a profile is already running", **_state}), 409
+        _state["running"] = True
+        _state["until"] = time.time() + seconds
+
+    labels = _handler_labels(current_app)
+    threading.Thread(
+        target=_run, args=(labels, seconds, 1 / hz, current_app.root_path, current_app.logger),
+        name="profiler", daemon=True,
+    ).start()
+    return jsonify({"running": True, "seconds": seconds, "hz": hz}), 202
+
+
+@bp.route("/admin/profile/<kind>")
+def profile_file(kind):
+    if kind not in ("collapsed", "allocations"):
+        abort(404)
+    with _lock:
+        last = _state["last"]
+    if not last:
+        abort(404)
+    return send_file(last[kind], mimetype="text/plain")
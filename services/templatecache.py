@@ -0,0 +1,54 @@
+"""
+Compiled templates shared across workers and restarts.
+
+Jinja compiles each template to Python on its first render, per process.
+configure() gives the app's Jinja environment an on-disk bytecode cache:
+the first process to compile a template writes it, and every later worker
+loads the code object instead of compiling it again. Entries are keyed by
+template name and source checksum, so an edited template just gets a new
+entry. Writes are atomic (temp file, then rename), so workers can share
+one directory.
+
+warm() compiles every .html template up front. It runs as an init plugin,
+so the first request waits for it the same way it waits for plugins.
+
+    TEMPLATE_CACHE=0       no bytecode cache
+    TEMPLATE_CACHE_DIR     cache directory (default: a per-user temp dir)
+    TEMPLATE_WARMUP=0      compile templates on first use instead
+"""
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+ENABLED = os.environ.get("TEMPLATE_CACHE", "1") != "0"
+CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR") or None
+WARMUP = os.environ.get("TEMPLATE_WARMUP", "1") != "0"
+
+
+def configure(app, directory=CACHE_DIR, enabled=ENABLED):
+    if not enabled:
+        return None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.bytecode_cache = cache
+    return cache
+
+
+def warm(app, socketio=None, enabled=WARMUP):
+    """Compile every .html template into the environment's in-memory cache."""
+    if not enabled:
+        return []
+    env = app.jinja_env
+    compiled = []
+    for name in env.list_templates(extensions=["html"]):
+        started = time.perf_counter()
+        try:
+            env.get_template(name)
+        except Exception as e:
+            # a broken template fails its own page later, not startup
+            app.logger.warning("template %s not compiled: %s: %s", name, type(e).__name__, e)
+            continue
+        compiled.append((name, (time.perf_counter() - started) * 1000))
+    return compiled